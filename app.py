@@ -1,48 +1,161 @@
-from flask import Flask, request, render_template, jsonify, url_for
+import time
+import threading
+import multiprocessing
+
+from flask import Flask, Response, request, render_template, jsonify, url_for
 
 from us_visa.constant import APP_HOST, APP_PORT
+from us_visa.entity.config_entity import USvisaPredictorConfig
+from us_visa.entity.estimator import TargetValueMapping
 from us_visa.pipeline.prediction_pipeline import USvisaData, USvisaClassifier
-from us_visa.pipeline.training_pipeline import TrainingPipeline
+from us_visa.pipeline.drift_monitor import DriftMonitor
+from us_visa.pipeline.training_job import TrainingJobManager
+from us_visa.logger import logging
+from us_visa.utils.metrics import PREDICTION_REQUESTS, time_stage, register_metrics_source, get_metrics_exposition
 
 app = Flask(__name__)
 
+model_ready = threading.Event()
+
+def preload_model():
+    """
+    loads and warms up production model, retries until it succeeds
+    """
+    predictor_config = USvisaPredictorConfig()
+    while not model_ready.is_set():
+        try:
+            USvisaClassifier(predictor_config).warm_up()
+            model_ready.set()
+        except Exception as e:
+            logging.info(f"model preload failed, retrying in {predictor_config.preload_retry_interval}s: {e}")
+            time.sleep(predictor_config.preload_retry_interval)
+
+# training jobs re-import this module in spawned workers, only the serving process preloads the model
+if multiprocessing.parent_process() is None:
+    threading.Thread(target=preload_model,name="usvisa-model-preload",daemon=True).start()
+
+    predictor_config = USvisaPredictorConfig()
+    if predictor_config.prediction_cache_enabled:
+        register_metrics_source("prediction_cache",USvisaClassifier(predictor_config).get_prediction_cache().get_metrics)
+    if predictor_config.batching_enabled:
+        register_metrics_source("prediction_batcher",USvisaClassifier(predictor_config).get_batcher().get_metrics)
+    if predictor_config.drift_monitor_enabled:
+        register_metrics_source("drift",DriftMonitor.get_instance(check_interval=predictor_config.drift_check_interval,
+                                                                  min_records=predictor_config.drift_min_records,
+                                                                  window_records=predictor_config.drift_window_records).get_metrics)
+
+def get_outcome(case_status:str)->str:
+    return "approved" if case_status == "Certified" else "rejected"
+
+@app.get("/healthz")
+def healthz():
+    return jsonify(status="ok")
+
+@app.get("/metrics")
+def metrics():
+    body,content_type = get_metrics_exposition()
+    return Response(body,content_type=content_type)
+
+@app.get("/readyz")
+def readyz():
+    if model_ready.is_set() and USvisaClassifier().is_model_loaded():
+        return jsonify(status="ready",model_version=USvisaClassifier().get_model_cache().model_version)
+    return jsonify(status="not ready"),503
+
 @app.route("/",methods=["POST","GET"])
 def predict():
     if request.method == "GET":
         return render_template("usvisa.html")
     else:
-        usvisa_data = USvisaData(continent=request.form.get("continent"),
-                                 has_job_experience=request.form.get("has_job_experience"),
-                                 requires_job_training=request.form.get("requires_job_training"),
-                                 no_of_employees=request.form.get("no_of_employees"),
-                                 company_age=request.form.get("company_age"),
-                                 region_of_employment=request.form.get("region_of_employment"),
-                                 prevailing_wage=request.form.get("prevailing_wage"),
-                                 unit_of_wage=request.form.get("unit_of_wage"),
-                                 full_time_position=request.form.get("full_time_position"),
-                                 education_of_employee=request.form.get("education_of_employee")
-        )
-        usvisa_df = usvisa_data.get_usvisa_data_input_dataframe()
-        model_predictor = USvisaClassifier()
-        value = model_predictor.predict(usvisa_df)[0]
+        with time_stage("parse"):
+            try:
+                usvisa_data = USvisaData.from_dict(request.form.to_dict())
+            except ValueError as e:
+                PREDICTION_REQUESTS.labels(endpoint="form",outcome="error").inc()
+                return render_template("usvisa.html",context=f"invalid input, {e}"),400
+        try:
+            model_predictor = USvisaClassifier()
+            value = model_predictor.predict_record(usvisa_data)
+        except Exception:
+            PREDICTION_REQUESTS.labels(endpoint="form",outcome="error").inc()
+            raise
+
+        outcome = get_outcome(TargetValueMapping().reverse_mapping()[int(value)])
+        PREDICTION_REQUESTS.labels(endpoint="form",outcome=outcome).inc()
 
         status = None
-        if value == 1:
+        if outcome == "approved":
             status = "visa-approved"
         else:
             status = "visa-rejected"
 
         return render_template("usvisa.html",context=status)
     
+@app.post("/predict/batch")
+def predict_batch():
+    """
+    scores json payload {"records": [...]} where every record has the fields of USvisaData
+    """
+    with time_stage("parse"):
+        payload = request.get_json(silent=True)
+    records = payload.get("records") if isinstance(payload,dict) else None
+    if not isinstance(records,list):
+        PREDICTION_REQUESTS.labels(endpoint="batch",outcome="error").inc()
+        return jsonify(error="request body must be a json object with a list of records"),400
+
+    max_batch_size = USvisaPredictorConfig().max_batch_size
+    if len(records) > max_batch_size:
+        PREDICTION_REQUESTS.labels(endpoint="batch",outcome="error").inc()
+        return jsonify(error=f"batch size {len(records)} exceeds maximum of {max_batch_size}"),413
+
+    try:
+        model_predictor = USvisaClassifier()
+        predictions = model_predictor.predict_batch(records)
+    except Exception as e:
+        PREDICTION_REQUESTS.labels(endpoint="batch",outcome="error").inc(max(len(records),1))
+        return jsonify(error=f"error occured: {e}"),500
+
+    for prediction in predictions:
+        outcome = get_outcome(prediction["case_status"]) if "case_status" in prediction else "error"
+        PREDICTION_REQUESTS.labels(endpoint="batch",outcome=outcome).inc()
+    return jsonify(predictions=predictions)
+
+@app.get("/drift")
+def drift():
+    """
+    returns drift of live prediction inputs against training data of the serving model
+    """
+    try:
+        drift_monitor = USvisaClassifier().get_drift_monitor()
+        if drift_monitor is None:
+            return jsonify(error="drift monitoring is disabled"),404
+        if drift_monitor.model_version is None:
+            return jsonify(error="serving model has no reference sketch"),503
+        return jsonify(drift_monitor.get_report())
+    except Exception as e:
+        return jsonify(error=f"error occured: {e}"),500
+
 @app.get("/train")
 def trainRouteClient():
+    """
+    starts training pipeline in a worker process and returns id of the job
+    """
     try:
-        train_pipeline = TrainingPipeline()
-        train_pipeline.run_pipeline()
-
-        return "training successful !!"
+        job_id,created = TrainingJobManager().submit()
+        message = "training job started" if created else "training job already running"
+        return jsonify(job_id=job_id,message=message,status_url=url_for("trainStatusRouteClient",job_id=job_id)),202
     except Exception as e:
-        return f"error occured: {e}"
+        return jsonify(error=f"error occured: {e}"),500
+
+@app.get("/train/<job_id>")
+def trainStatusRouteClient(job_id):
+    """
+    returns state, per stage progress and artifacts of a training job
+    """
+    status = TrainingJobManager().get_status(job_id)
+    if status is None:
+        return jsonify(error=f"training job {job_id} not found"),404
+    return jsonify(status)
     
 if __name__ == "__main__":
     app.run(host=APP_HOST, port=APP_PORT)
@@ -0,0 +1,279 @@
+"""
+Load test and latency benchmark of the prediction service
+
+It starts a moto s3 server as local stand-in for the model bucket, trains a small USvisaModel on
+us_visa/notebooks/EasyVisa.csv and uploads it, starts app.py in a separate process pointed at the
+fake s3 server and drives / and /predict/batch at fixed concurrency levels. Throughput,
+p50/p95/p99 latency and server memory are written to a json file and compared with a stored baseline
+
+usage (from repository root):
+    python benchmark/serving_benchmark.py                    compare against benchmark/baseline.json
+    python benchmark/serving_benchmark.py --compare          same, but fail when there is no baseline to compare with
+    python benchmark/serving_benchmark.py --save-baseline    store results as new baseline
+
+benchmark/baseline.json is a reference run on the machine noted in its "cpu_count" and "platform" fields,
+latency and throughput depend on hardware, so store a new baseline before comparing on other machines
+"""
+import os
+import sys
+import json
+import time
+import socket
+import platform
+import argparse
+import tempfile
+import subprocess
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,ROOT_DIR)
+
+BENCHMARK_DIR = os.path.join(ROOT_DIR,'benchmark')
+DEFAULT_BASELINE_FILE_PATH = os.path.join(BENCHMARK_DIR,'baseline.json')
+DEFAULT_RESULT_FILE_PATH = os.path.join(BENCHMARK_DIR,'results','latest.json')
+SAMPLE_DATA_FILE_PATH = os.path.join(ROOT_DIR,'us_visa','notebooks','EasyVisa.csv')
+FEATURE_COLUMNS = ["continent","education_of_employee","has_job_experience","requires_job_training",
+                   "no_of_employees","region_of_employment","prevailing_wage","unit_of_wage",
+                   "full_time_position","company_age"]
+SEED = 42
+
+
+def get_free_port()->int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1",0))
+        return sock.getsockname()[1]
+
+
+def load_sample_features()->pd.DataFrame:
+    from us_visa.constant import CURRENT_YEAR
+    dataframe = pd.read_csv(SAMPLE_DATA_FILE_PATH)
+    dataframe['company_age'] = CURRENT_YEAR - dataframe['yr_of_estab']
+    return dataframe
+
+
+def train_benchmark_model(dataframe:pd.DataFrame,model_file_path:str):
+    """
+    trains a small but complete USvisaModel with the preprocessor used by the training pipeline
+    """
+    from sklearn.ensemble import RandomForestClassifier
+    from us_visa.constant import TARGET_COLUMN, SCHEMA_FILE_PATH
+    from us_visa.components.data_transformation import DataTransformation
+    from us_visa.entity.compiled_preprocessor import CompiledPreprocessor
+    from us_visa.entity.estimator import USvisaModel, TargetValueMapping
+    from us_visa.utils.main_utils import save_object, read_yaml_file
+
+    data_transformation = DataTransformation.__new__(DataTransformation)
+    data_transformation._schema_config = read_yaml_file(filepath=os.path.join(ROOT_DIR,SCHEMA_FILE_PATH))
+    preprocessor = data_transformation.get_data_transformer_object()
+
+    features = dataframe[FEATURE_COLUMNS]
+    target = dataframe[TARGET_COLUMN].map(TargetValueMapping()._asdict())
+    transformed_features = preprocessor.fit_transform(features)
+    model = RandomForestClassifier(n_estimators=20,max_depth=10,random_state=SEED).fit(transformed_features,target)
+
+    compiled_preprocessor = CompiledPreprocessor.from_column_transformer(preprocessor)
+    save_object(model_file_path,USvisaModel(preprocessing_obj=preprocessor,
+                                            trained_model_obj=model,
+                                            compiled_preprocessing_obj=compiled_preprocessor))
+
+
+def start_fake_s3(model_file_path:str):
+    from moto.server import ThreadedMotoServer
+    import boto3
+    from us_visa.constant import MODEL_BUCKET_NAME, MODEL_FILE_NAME, REGION_NAME
+
+    port = get_free_port()
+    server = ThreadedMotoServer(ip_address="127.0.0.1",port=port)
+    server.start()
+    endpoint_url = f"http://127.0.0.1:{port}"
+
+    s3_client = boto3.client('s3',endpoint_url=endpoint_url,region_name=REGION_NAME,
+                             aws_access_key_id="benchmark",aws_secret_access_key="benchmark")
+    s3_client.create_bucket(Bucket=MODEL_BUCKET_NAME)
+    s3_client.upload_file(model_file_path,MODEL_BUCKET_NAME,MODEL_FILE_NAME)
+    return server,endpoint_url
+
+
+def start_app(endpoint_url:str,port:int,log_file):
+    env = dict(os.environ,
+               AWS_ACCESS_KEY_ID="benchmark",
+               AWS_SECRET_ACCESS_KEY="benchmark",
+               AWS_ENDPOINT_URL_S3=endpoint_url,
+               PYTHONPATH=ROOT_DIR)
+    process = subprocess.Popen([sys.executable,"-m","flask","--app","app","run",
+                                "--host","127.0.0.1","--port",str(port),"--with-threads"],
+                               cwd=ROOT_DIR,env=env,stdout=log_file,stderr=subprocess.STDOUT)
+
+    ready_url = f"http://127.0.0.1:{port}/readyz"
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("app process exited during startup")
+        try:
+            with urllib.request.urlopen(ready_url,timeout=1) as response:
+                if response.status == 200:
+                    return process
+        except (urllib.error.URLError,ConnectionError):
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("app did not become ready within 120 seconds")
+
+
+def get_rss_bytes(pid:int):
+    try:
+        with open(f"/proc/{pid}/status") as file_obj:
+            for line in file_obj:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])*1024
+    except OSError:
+        return None
+    return None
+
+
+def build_requests(dataframe:pd.DataFrame,endpoint:str,batch_size:int,n_requests:int,base_url:str)->list:
+    rng = np.random.default_rng(SEED)
+    records = dataframe[FEATURE_COLUMNS].to_dict(orient='records')
+    requests = []
+    for _ in range(n_requests):
+        if endpoint == "form":
+            record = records[rng.integers(len(records))]
+            body = urllib.parse.urlencode({key:str(value) for key,value in record.items()}).encode()
+            requests.append(urllib.request.Request(f"{base_url}/",data=body,method="POST",
+                                                   headers={"Content-Type":"application/x-www-form-urlencoded"}))
+        else:
+            indexes = rng.integers(len(records),size=batch_size)
+            body = json.dumps({"records":[records[index] for index in indexes]},default=float).encode()
+            requests.append(urllib.request.Request(f"{base_url}/predict/batch",data=body,method="POST",
+                                                   headers={"Content-Type":"application/json"}))
+    return requests
+
+
+def send_request(request:urllib.request.Request):
+    started_at = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request,timeout=60) as response:
+            response.read()
+            ok = response.status == 200
+    except (urllib.error.URLError,ConnectionError):
+        ok = False
+    return time.perf_counter() - started_at,ok
+
+
+def run_level(requests:list,concurrency:int,server_pid:int)->dict:
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(send_request,requests))
+    elapsed = time.perf_counter() - started_at
+
+    latencies = np.array([latency for latency,ok in results if ok])
+    n_errors = sum(1 for _,ok in results if not ok)
+    percentiles = np.percentile(latencies,[50,95,99])*1000 if len(latencies) > 0 else [None]*3
+    return {
+        "requests":len(requests),
+        "errors":n_errors,
+        "throughput_rps":len(latencies)/elapsed,
+        "p50_ms":float(percentiles[0]) if percentiles[0] is not None else None,
+        "p95_ms":float(percentiles[1]) if percentiles[1] is not None else None,
+        "p99_ms":float(percentiles[2]) if percentiles[2] is not None else None,
+        "server_rss_mb":(get_rss_bytes(server_pid) or 0)/1024/1024
+    }
+
+
+def compare_with_baseline(results:dict,baseline:dict,tolerance:float)->list:
+    """
+    returns list of regressions: throughput lower or latency/memory higher than baseline by more than tolerance
+    """
+    regressions = []
+    for case,current in results["cases"].items():
+        reference = baseline.get("cases",{}).get(case)
+        if reference is None:
+            continue
+        if current["throughput_rps"] < reference["throughput_rps"]*(1 - tolerance):
+            regressions.append(f"{case}: throughput {current['throughput_rps']:.1f} rps < baseline {reference['throughput_rps']:.1f} rps")
+        for key in ("p50_ms","p95_ms","p99_ms","server_rss_mb"):
+            if current[key] is not None and reference.get(key) is not None and current[key] > reference[key]*(1 + tolerance):
+                regressions.append(f"{case}: {key} {current[key]:.2f} > baseline {reference[key]:.2f}")
+        if current["errors"] > reference.get("errors",0):
+            regressions.append(f"{case}: {current['errors']} errors, baseline had {reference.get('errors',0)}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="load test and latency benchmark of the prediction service")
+    parser.add_argument("--concurrency",type=int,nargs="+",default=[1,4,16])
+    parser.add_argument("--requests",type=int,default=500,help="requests per endpoint and concurrency level")
+    parser.add_argument("--batch-size",type=int,default=100,help="records per /predict/batch request")
+    parser.add_argument("--baseline",default=DEFAULT_BASELINE_FILE_PATH)
+    parser.add_argument("--output",default=DEFAULT_RESULT_FILE_PATH)
+    parser.add_argument("--tolerance",type=float,default=0.15,help="allowed relative change before it counts as regression")
+    parser.add_argument("--save-baseline",action="store_true")
+    parser.add_argument("--compare",action="store_true",help="exit with an error when there is no baseline to compare with")
+    args = parser.parse_args()
+
+    if args.compare and not args.save_baseline and not os.path.exists(args.baseline):
+        print(f"no baseline at {args.baseline}, run with --save-baseline to create one")
+        return 2
+
+    dataframe = load_sample_features()
+    work_dir = tempfile.mkdtemp(prefix="usvisa_benchmark_")
+    model_file_path = os.path.join(work_dir,"model.pkl")
+    train_benchmark_model(dataframe,model_file_path)
+
+    s3_server,endpoint_url = start_fake_s3(model_file_path)
+    app_port = get_free_port()
+    base_url = f"http://127.0.0.1:{app_port}"
+    with open(os.path.join(work_dir,"app.log"),"w") as log_file:
+        app_process = start_app(endpoint_url,app_port,log_file)
+        try:
+            results = {"created_at":time.strftime("%Y-%m-%dT%H:%M:%S"),
+                       "python":sys.version.split()[0],
+                       "platform":platform.platform(),
+                       "cpu_count":os.cpu_count(),
+                       "startup_rss_mb":(get_rss_bytes(app_process.pid) or 0)/1024/1024,
+                       "cases":{}}
+            for endpoint in ("form","batch"):
+                # warm up connections, caches and lazy imports before measuring
+                run_level(build_requests(dataframe,endpoint,args.batch_size,20,base_url),1,app_process.pid)
+                for concurrency in args.concurrency:
+                    requests = build_requests(dataframe,endpoint,args.batch_size,args.requests,base_url)
+                    case = f"{endpoint}_c{concurrency}"
+                    results["cases"][case] = run_level(requests,concurrency,app_process.pid)
+                    print(f"{case}: {json.dumps(results['cases'][case])}")
+        finally:
+            app_process.terminate()
+            app_process.wait()
+            s3_server.stop()
+
+    os.makedirs(os.path.dirname(args.output),exist_ok=True)
+    with open(args.output,"w") as file_obj:
+        json.dump(results,file_obj,indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline,"w") as file_obj:
+            json.dump(results,file_obj,indent=2)
+        print(f"saved baseline to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"no baseline at {args.baseline}, run with --save-baseline to create one")
+        return 2 if args.compare else 0
+
+    with open(args.baseline) as file_obj:
+        baseline = json.load(file_obj)
+    regressions = compare_with_baseline(results,baseline,args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if len(regressions) == 0:
+        print(f"no regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 1 if len(regressions) > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.base import clone
+
+from us_visa.components.data_transformation import DataTransformation
+from us_visa.constant import SCHEMA_FILE_PATH
+from us_visa.entity.compiled_preprocessor import CompiledPreprocessor
+from us_visa.exception import VisaException
+from us_visa.utils.main_utils import read_yaml_file, add_company_age
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_DATA_FILE_PATH = os.path.join(ROOT_DIR,'us_visa','notebooks','EasyVisa.csv')
+
+
+@pytest.fixture(scope="module")
+def features():
+    schema_config = read_yaml_file(filepath=os.path.join(ROOT_DIR,SCHEMA_FILE_PATH))
+    dataframe = add_company_age(pd.read_csv(SAMPLE_DATA_FILE_PATH))
+    return dataframe.drop(columns=schema_config['drop_columns'] + ['case_status'])
+
+
+@pytest.fixture(scope="module")
+def preprocessor(features):
+    data_transformation = DataTransformation.__new__(DataTransformation)
+    data_transformation._schema_config = read_yaml_file(filepath=os.path.join(ROOT_DIR,SCHEMA_FILE_PATH))
+    return data_transformation.get_data_transformer_object().fit(features)
+
+
+@pytest.fixture(scope="module")
+def boundary_features(features):
+    # zero, negative (other yeo-johnson branch), smallest and largest seen and far beyond seen values
+    numbers = [0,-1,-26,1,features['no_of_employees'].max(),10**9]
+    rows = features.head(len(numbers)).copy()
+    rows['no_of_employees'] = numbers
+    rows['prevailing_wage'] = [0.0,-1.0,features['prevailing_wage'].min(),1e-9,features['prevailing_wage'].max(),1e12]
+    rows['company_age'] = [0,-5,1,features['company_age'].max(),500,-1000]
+    return rows.reset_index(drop=True)
+
+
+def test_transform_matches_column_transformer(preprocessor,features):
+    compiled_preprocessor = CompiledPreprocessor.from_column_transformer(preprocessor)
+    np.testing.assert_allclose(compiled_preprocessor.transform(features),preprocessor.transform(features),rtol=0,atol=1e-8)
+
+
+def test_transform_record_matches_column_transformer(preprocessor,features):
+    compiled_preprocessor = CompiledPreprocessor.from_column_transformer(preprocessor)
+    sample = features.sample(200,random_state=42)
+    expected = preprocessor.transform(sample)
+    for index,record in enumerate(sample.to_dict(orient='records')):
+        np.testing.assert_allclose(compiled_preprocessor.transform_record(record),expected[index:index + 1],rtol=0,atol=1e-8)
+
+
+def test_boundary_numeric_values(preprocessor,boundary_features):
+    compiled_preprocessor = CompiledPreprocessor.from_column_transformer(preprocessor)
+    expected = preprocessor.transform(boundary_features)
+    np.testing.assert_allclose(compiled_preprocessor.transform(boundary_features),expected,rtol=1e-12,atol=1e-8)
+    for index,record in enumerate(boundary_features.to_dict(orient='records')):
+        np.testing.assert_allclose(compiled_preprocessor.transform_record(record),expected[index:index + 1],rtol=1e-12,atol=1e-8)
+
+
+@pytest.mark.parametrize("column",["continent","education_of_employee"])
+def test_unseen_category_is_rejected_like_column_transformer(preprocessor,features,column):
+    compiled_preprocessor = CompiledPreprocessor.from_column_transformer(preprocessor)
+    rows = features.head(3).copy()
+    rows.loc[1,column] = "Mars"
+    with pytest.raises(ValueError):
+        preprocessor.transform(rows)
+    with pytest.raises(VisaException,match="unknown category"):
+        compiled_preprocessor.transform(rows)
+    with pytest.raises(VisaException,match="unknown category"):
+        compiled_preprocessor.transform_record(rows.iloc[1].to_dict())
+
+
+def test_unseen_category_is_ignored_like_column_transformer(preprocessor,features):
+    ignoring_preprocessor = clone(preprocessor).set_params(OneHotencoder__handle_unknown='ignore').fit(features)
+    compiled_preprocessor = CompiledPreprocessor.from_column_transformer(ignoring_preprocessor)
+    rows = features.head(3).copy()
+    rows.loc[1,'continent'] = "Mars"
+    expected = ignoring_preprocessor.transform(rows)
+    np.testing.assert_allclose(compiled_preprocessor.transform(rows),expected,rtol=0,atol=1e-8)
+    np.testing.assert_allclose(compiled_preprocessor.transform_record(rows.iloc[1].to_dict()),expected[1:2],rtol=0,atol=1e-8)
+
+
+def test_unsupported_transformer_raises_value_error(preprocessor,features):
+    passthrough_preprocessor = clone(preprocessor).set_params(power_transformer='passthrough').fit(features)
+    with pytest.raises(ValueError,match="passthrough"):
+        CompiledPreprocessor.from_column_transformer(passthrough_preprocessor)
@@ -0,0 +1,67 @@
+import os
+
+import pandas as pd
+import pytest
+from sklearn.tree import DecisionTreeClassifier
+
+from us_visa.components.data_transformation import DataTransformation
+from us_visa.constant import SCHEMA_FILE_PATH, TARGET_COLUMN
+from us_visa.entity.config_entity import USvisaPredictorConfig
+from us_visa.entity.estimator import USvisaModel, TargetValueMapping
+from us_visa.pipeline.prediction_pipeline import USvisaData, USvisaClassifier
+from us_visa.utils.main_utils import read_yaml_file, add_company_age
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_DATA_FILE_PATH = os.path.join(ROOT_DIR,'us_visa','notebooks','EasyVisa.csv')
+
+
+@pytest.fixture(scope="module")
+def records():
+    schema_config = read_yaml_file(filepath=os.path.join(ROOT_DIR,SCHEMA_FILE_PATH))
+    dataframe = add_company_age(pd.read_csv(SAMPLE_DATA_FILE_PATH)).drop(columns=schema_config['drop_columns'])
+    return dataframe.head(2000).to_dict(orient='records')
+
+
+@pytest.fixture(scope="module")
+def model(records):
+    dataframe = pd.DataFrame(records)
+    features = dataframe.drop(columns=[TARGET_COLUMN])
+    target = dataframe[TARGET_COLUMN].replace(TargetValueMapping()._asdict()).astype(int)
+    data_transformation = DataTransformation.__new__(DataTransformation)
+    data_transformation._schema_config = read_yaml_file(filepath=os.path.join(ROOT_DIR,SCHEMA_FILE_PATH))
+    preprocessor = data_transformation.get_data_transformer_object().fit(features)
+    trained_model = DecisionTreeClassifier(max_depth=4,random_state=42).fit(preprocessor.transform(features),target)
+    return USvisaModel(preprocessing_obj=preprocessor,trained_model_obj=trained_model)
+
+
+@pytest.fixture
+def classifier(model,monkeypatch):
+    classifier = USvisaClassifier(USvisaPredictorConfig(prediction_cache_enabled=False,drift_monitor_enabled=False,
+                                                        batching_enabled=False))
+    monkeypatch.setattr(classifier,"get_model",lambda: model)
+    return classifier
+
+
+@pytest.mark.parametrize("value",["inf","-inf","nan","1e400"])
+def test_non_finite_number_is_rejected(records,value):
+    record = dict(records[0],prevailing_wage=value)
+    with pytest.raises(ValueError,match="prevailing_wage must be a finite number"):
+        USvisaData.from_dict(record)
+
+
+def test_batch_with_non_finite_record_scores_other_records(classifier,records):
+    batch = [dict(record) for record in records[:3]]
+    batch[1]['prevailing_wage'] = "inf"
+    results = classifier.predict_batch(batch)
+    assert results[1] == {"index":1,"error":"prevailing_wage must be a finite number, got 'inf'"}
+    for index in (0,2):
+        assert results[index]["index"] == index
+        assert results[index]["case_status"] in ("Certified","Denied")
+
+
+def test_values_are_normalised_once_for_cache_key_and_model(classifier,records):
+    padded = dict(records[0],continent=f" {records[0]['continent']} ",no_of_employees=str(records[0]['no_of_employees']))
+    usvisa_data = USvisaData.from_dict(padded)
+    assert usvisa_data.get_usvisa_data_as_record()['continent'] == records[0]['continent']
+    assert usvisa_data.get_cache_key() == USvisaData.from_dict(records[0]).get_cache_key()
+    assert classifier.predict_record(usvisa_data) == classifier.predict_record(USvisaData.from_dict(records[0]))
@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+from us_visa.entity.config_entity import TrainingJobConfig
+from us_visa.pipeline import training_job
+from us_visa.pipeline.training_job import TrainingJobManager, TrainingJobStatus
+
+
+class NotStartedProcess:
+    """
+    stands in for a spawned worker which has not written its status yet
+    """
+    def __init__(self,target,args,name):
+        self.pid = os.getpid()
+
+    def start(self):
+        pass
+
+
+class NotStartedContext:
+    Process = NotStartedProcess
+
+
+@pytest.fixture
+def manager(tmp_path,monkeypatch):
+    monkeypatch.setattr(training_job.multiprocessing,"get_context",lambda method: NotStartedContext)
+    training_job_dir = str(tmp_path)
+    return TrainingJobManager(TrainingJobConfig(training_job_dir=training_job_dir,
+                                                lock_file_path=os.path.join(training_job_dir,"active_job.lock")))
+
+
+def test_second_submit_while_first_writes_status_joins_first_job(manager,monkeypatch):
+    # second request arrives between lock creation and the first status write of the first request
+    second_submits = []
+    write = TrainingJobStatus.write
+
+    def write_after_second_submit(job_status,status):
+        if len(second_submits) == 0:
+            second_submits.append(manager.submit())
+        write(job_status,status)
+
+    monkeypatch.setattr(TrainingJobStatus,"write",write_after_second_submit)
+    job_id,started = manager.submit()
+    assert started
+    assert second_submits == [(job_id,False)]
+    assert manager.get_active_job_id() == job_id
+
+
+def test_second_submit_before_worker_status_joins_first_job(manager):
+    job_id,started = manager.submit()
+    assert started
+    assert manager.get_status(job_id)["state"] == "queued"
+    assert manager.submit() == (job_id,False)
+
+
+def test_lock_of_dead_submitter_without_status_is_stale(manager):
+    assert manager._acquire_lock("0"*32)
+    lock = manager._read_lock()
+    manager._write_lock(dict(lock,pid=2**22 + 1))
+    assert manager.get_active_job_id() is None
+    job_id,started = manager.submit()
+    assert started and job_id != "0"*32
@@ -96,6 +96,41 @@ class SimpleStorageService:
         except Exception as e:
             raise VisaException(e,sys)
         
+    @staticmethod
+    def get_version_from_response(response):
+        """
+        Method_name : get_version_from_response
+        Description : this method picks VersionId from s3 response, ETag is used for unversioned buckets
+        """
+        version_id = response.get('VersionId')
+        if version_id is None or version_id == 'null':
+            return response['ETag']
+        return version_id
+
+    def get_object_version(self, filename, bucket_name):
+        """
+        Method_name : get_object_version
+        Description : this method gets version of filename object in bucket_name without downloading it
+        """
+        try:
+            response = self.s3_client.head_object(Bucket=bucket_name, Key=filename)
+            return self.get_version_from_response(response)
+        except Exception as e:
+            raise VisaException(e,sys)
+
+    def load_model_with_version(self, model_name, bucket_name):
+        """
+        Method_name : load_model_with_version
+        Description : this method loads model_name model from bucket_name along with version of the object
+                      read in the same request, so model and version always belong together
+        """
+        try:
+            response = self.s3_client.get_object(Bucket=bucket_name, Key=model_name)
+            model = pickle.loads(response['Body'].read())
+            return model, self.get_version_from_response(response)
+        except Exception as e:
+            raise VisaException(e,sys)
+
     def create_folder(self, foldr_name, bucket_name):
         """
         Method_name : create_folder
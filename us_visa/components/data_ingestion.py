@@ -1,32 +1,166 @@
 from us_visa.exception import VisaException
 from us_visa.logger import logging
 import os,sys
+from datetime import datetime
 from sklearn.model_selection import train_test_split
 
 from us_visa.entity.config_entity import DataIngestionConfig
 from us_visa.entity.artifact_entity import DataIngestionArtifact
 
+import numpy as np
+import pandas as pd
 from pandas import DataFrame
+from bson import ObjectId
 
 from us_visa.data_access.usvisadata import UsVisaData
+from us_visa.utils.main_utils import read_yaml_file, write_yaml_file, read_dataframe, write_dataframe, \
+    compact_dataframe, get_memory_usage, log_memory_report, DataFrameChunkWriter
+from us_visa.constant import SCHEMA_FILE_PATH
 
 class DataIngestion:
     def __init__(self,data_ingestion_config:DataIngestionConfig=DataIngestionConfig()):
         try:
             self.data_ingestion_config = data_ingestion_config
+            self._schema_config = read_yaml_file(filepath=SCHEMA_FILE_PATH)
+            # unique per row columns like case_id gain nothing from dictionary encoding
+            self._categorical_columns = [column for column in self._schema_config['categorical_columns']
+                                         if column not in self._schema_config['drop_columns']]
         except Exception as e:
             raise VisaException(e,sys)
         
+    def read_watermark(self):
+        """
+        Method Name : read_watermark
+        Description : this method reads high water mark saved by previous incremental ingestion
+        Output      : watermark value, None when there is no usable watermark
+        """
+        watermark_file_path = self.data_ingestion_config.watermark_file_path
+        if not os.path.exists(watermark_file_path):
+            return None
+        watermark = read_yaml_file(filepath=watermark_file_path)
+        if watermark.get('field') != self.data_ingestion_config.watermark_field:
+            logging.info(f"watermark field changed from {watermark.get('field')}, ignoring saved watermark")
+            return None
+        if watermark.get('type') == 'objectid':
+            return ObjectId(watermark['value'])
+        if watermark.get('type') == 'datetime':
+            return datetime.fromisoformat(watermark['value'])
+        return watermark['value']
+
+    def write_watermark(self,watermark):
+        """
+        Method Name : write_watermark
+        Description : this method saves high water mark of ingested documents
+        """
+        if isinstance(watermark,ObjectId):
+            watermark_type,value = 'objectid',str(watermark)
+        elif isinstance(watermark,datetime):
+            watermark_type,value = 'datetime',watermark.isoformat()
+        else:
+            watermark_type,value = 'value',watermark
+        write_yaml_file(filepath=self.data_ingestion_config.watermark_file_path,
+                        obj={'field':self.data_ingestion_config.watermark_field,'type':watermark_type,'value':value},
+                        replace=True)
+
+    def get_feature_pipeline(self,us_visa_data:UsVisaData):
+        """
+        returns aggregation stages deriving features on mongodb when server side features are enabled, otherwise None
+        split and key columns are kept as ingestion still needs them
+        """
+        config = self.data_ingestion_config
+        if not config.server_side_features:
+            return None
+        return us_visa_data.get_feature_pipeline(keep_columns=[config.split_key_column,config.key_column])
+
+    def compact_dataframe(self,dataframe:DataFrame)->DataFrame:
+        """
+        applies schema dtypes to exported data and logs memory before and after
+        """
+        memory_before = get_memory_usage(dataframe)
+        dataframe = compact_dataframe(dataframe,self._schema_config)
+        log_memory_report('data_ingestion',memory_before,get_memory_usage(dataframe),'exported data')
+        return dataframe
+
+    def export_incremental_data_into_feature_store(self)->DataFrame:
+        """
+        Method Name : export_incremental_data_into_feature_store
+        Description : this method exports only documents newer than saved watermark and merges them
+                      into persistent feature store which is reused across training runs
+        Output      : complete feature store dataframe
+        On failure  : write a exception log and raises exception
+        """
+        try:
+            config = self.data_ingestion_config
+            feature_store_filepath = config.persistent_feature_store_file_path
+            full_refresh = config.full_refresh or not os.path.exists(feature_store_filepath)
+            watermark = None if full_refresh else self.read_watermark()
+            if watermark is None:
+                full_refresh = True
+
+            logging.info(f"exporting data from mongodb with {config.watermark_field} > {watermark}, full refresh {full_refresh}")
+            us_visa_data = UsVisaData()
+            new_dataframe,new_watermark = us_visa_data.export_data_after_watermark(collection_name=config.collection_name,
+                                                                                   watermark_field=config.watermark_field,
+                                                                                   watermark=watermark,
+                                                                                   batch_size=config.cursor_batch_size)
+            logging.info(f"exported {len(new_dataframe)} new or changed rows")
+
+            if full_refresh:
+                dataframe = new_dataframe
+            else:
+                dataframe = read_dataframe(feature_store_filepath)
+                if len(new_dataframe) > 0:
+                    dataframe = pd.concat([dataframe,new_dataframe],ignore_index=True)
+            dataframe = self.compact_dataframe(dataframe)
+
+            # rows are in watermark order, so the last row of a key is its newest version
+            if len(new_dataframe) > 0 and config.key_column in dataframe.columns:
+                dataframe = dataframe.drop_duplicates(subset=[config.key_column],keep='last',ignore_index=True)
+
+            if full_refresh or len(new_dataframe) > 0:
+                os.makedirs(os.path.dirname(feature_store_filepath),exist_ok=True)
+                filepath_root,file_extension = os.path.splitext(feature_store_filepath)
+                tmp_filepath = f"{filepath_root}.tmp{file_extension}"
+                write_dataframe(dataframe,tmp_filepath,categorical_columns=self._categorical_columns)
+                os.replace(tmp_filepath,feature_store_filepath)
+                # watermark is written after feature store, a crash in between only re-reads the same documents
+                if new_watermark is not None:
+                    self.write_watermark(new_watermark)
+
+            logging.info(f"shape of data in feature store {feature_store_filepath}: {dataframe.shape}")
+            return dataframe
+        except Exception as e:
+            raise VisaException(e,sys)
+
     def export_data_into_feature_store(self):
         """
         Method Name : export_data_into_feature_store
-        Description : this method export data from mongodb to csv file
+        Description : this method export data from mongodb to feature store file
         """
+        config = self.data_ingestion_config
+        if config.incremental and not config.is_sampled:
+            return self.export_incremental_data_into_feature_store()
+
         logging.info('exporting data from mongodb')
 
         us_visa_data = UsVisaData()
-        dataframe = us_visa_data.export_data_as_dataframe(collection_name=self.data_ingestion_config.collection_name)
+        if config.is_sampled:
+            dataframe = us_visa_data.export_sample_as_dataframe(collection_name=config.collection_name,
+                                                                stratify_column=config.sample_stratify_column,
+                                                                sample_size=config.sample_size,
+                                                                fraction=config.sample_fraction,
+                                                                method=config.sample_method,
+                                                                seed=config.sample_seed,
+                                                                batch_size=config.cursor_batch_size,
+                                                                pipeline=self.get_feature_pipeline(us_visa_data))
+        else:
+            dataframe = us_visa_data.export_data_as_dataframe(collection_name=config.collection_name,
+                                                              batch_size=config.cursor_batch_size,
+                                                              parallelism=config.export_parallelism,
+                                                              partition_field=config.partition_field,
+                                                              pipeline=self.get_feature_pipeline(us_visa_data))
         logging.info(f"shape of data {dataframe.shape}")
+        dataframe = self.compact_dataframe(dataframe)
 
         feature_store_filepath = self.data_ingestion_config.feature_store_file_path
 
@@ -35,17 +169,38 @@ class DataIngestion:
         os.makedirs(dir_name,exist_ok=True)
 
         logging.info(f"saving exported data into feature store filepath {feature_store_filepath}")
-        dataframe.to_csv(feature_store_filepath,index=False,header=True)
+        write_dataframe(dataframe,feature_store_filepath,categorical_columns=self._categorical_columns)
         return dataframe
     
-    def split_data_as_train_test(self,dataframe:DataFrame)->None:
+    # number of hash buckets, split ratio is applied with a precision of 1/HASH_SPLIT_BUCKETS
+    HASH_SPLIT_BUCKETS = 10000
+
+    def get_test_mask(self,dataframe:DataFrame)->np.ndarray:
+        """
+        returns boolean array which is True for rows that belong to test set, a row is assigned by
+        stable hash of its split key column so the same key lands in the same set in every run
+        """
+        key_column = self.data_ingestion_config.split_key_column
+        if key_column not in dataframe.columns:
+            raise Exception(f"split key column {key_column} is not present in data, hash split needs it")
+        keys = dataframe[key_column].astype(str).to_numpy(dtype=object)
+        buckets = pd.util.hash_array(keys,categorize=False) % self.HASH_SPLIT_BUCKETS
+        return buckets < round(self.data_ingestion_config.train_test_split_ratio*self.HASH_SPLIT_BUCKETS)
+
+    def split_data_as_train_test(self,dataframe:DataFrame):
         """
         Method Name : split_data_as_train_test
-        Description : this method splits data into train and test based in split ratio
+        Description : this method splits data into train and test based in split ratio,
+                      by hash of split key column in hash mode and randomly otherwise
+        Output      : train and test dataframes which are also written to train and test files
         """
         logging.info('entered into split_data_as_train_test method of data ingestion class')
         try:
-            train_set, test_set = train_test_split(dataframe,test_size=self.data_ingestion_config.train_test_split_ratio)
+            if self.data_ingestion_config.split_mode == 'hash':
+                test_mask = self.get_test_mask(dataframe)
+                train_set, test_set = dataframe[~test_mask], dataframe[test_mask]
+            else:
+                train_set, test_set = train_test_split(dataframe,test_size=self.data_ingestion_config.train_test_split_ratio)
             logging.info("performed train test split on dataset")
 
             dir_path = os.path.dirname(self.data_ingestion_config.training_file_path)
@@ -53,13 +208,42 @@ class DataIngestion:
 
             logging.info("exporting train and test files")
 
-            train_set.to_csv(self.data_ingestion_config.training_file_path,index=False,header=True)
-            test_set.to_csv(self.data_ingestion_config.test_file_path,index=False,header=True)
+            write_dataframe(train_set,self.data_ingestion_config.training_file_path,categorical_columns=self._categorical_columns)
+            write_dataframe(test_set,self.data_ingestion_config.test_file_path,categorical_columns=self._categorical_columns)
 
             logging.info("exported training and test file path")
+            return train_set.reset_index(drop=True),test_set.reset_index(drop=True)
         except Exception as e:
              raise VisaException(e,sys)
         
+    def export_split_data_in_chunks(self):
+        """
+        Method Name : export_split_data_in_chunks
+        Description : this method streams data from mongodb in chunks and routes every row to train or test file
+                      by hash of split key column, the whole dataset is never held in memory
+        On failure  : write a exception log and raises exception
+        """
+        try:
+            config = self.data_ingestion_config
+            logging.info(f"streaming data from mongodb in chunks of {config.stream_chunk_size} rows")
+            us_visa_data = UsVisaData()
+            chunks = us_visa_data.export_data_in_chunks(collection_name=config.collection_name,
+                                                        chunk_size=config.stream_chunk_size,
+                                                        batch_size=config.cursor_batch_size,
+                                                        pipeline=self.get_feature_pipeline(us_visa_data))
+            # files are replaced only after every chunk is written, a failed export keeps the previous files
+            with DataFrameChunkWriter(config.feature_store_file_path,self._schema_config) as feature_store_writer, \
+                 DataFrameChunkWriter(config.training_file_path,self._schema_config) as train_writer, \
+                 DataFrameChunkWriter(config.test_file_path,self._schema_config) as test_writer:
+                for chunk in chunks:
+                    test_mask = self.get_test_mask(chunk)
+                    feature_store_writer.write(chunk)
+                    train_writer.write(chunk[~test_mask])
+                    test_writer.write(chunk[test_mask])
+            logging.info(f"streamed {feature_store_writer.n_rows} rows, {train_writer.n_rows} to train and {test_writer.n_rows} to test")
+        except Exception as e:
+            raise VisaException(e,sys)
+
     def initiate_data_ingestion(self):
         """
         Method Name : initiate_data_ingestion
@@ -68,18 +252,26 @@ class DataIngestion:
         On failure : write a exception log and raises exception
         """
         try:
-            dataframe = self.export_data_into_feature_store()
+            config = self.data_ingestion_config
+            if config.streaming and config.split_mode == 'hash' and not config.incremental and not config.is_sampled:
+                self.export_split_data_in_chunks()
+                # later stages read train and test files, nothing is held in memory
+                train_set,test_set = None,None
+            else:
+                dataframe = self.export_data_into_feature_store()
 
-            logging.info("got data from mongodb")
+                logging.info("got data from mongodb")
 
-            self.split_data_as_train_test(dataframe=dataframe)
+                train_set,test_set = self.split_data_as_train_test(dataframe=dataframe)
 
-            logging.info("performed train test split")
+                logging.info("performed train test split")
 
             logging.info("exited initiate_data_ingestion method of data ingestion class")
 
             data_ingestion_artifact = DataIngestionArtifact(train_file_path = self.data_ingestion_config.training_file_path,
-                                                            test_file_path = self.data_ingestion_config.test_file_path)
+                                                            test_file_path = self.data_ingestion_config.test_file_path,
+                                                            train_df = train_set,
+                                                            test_df = test_set)
             
             logging.info(f"data ingestion config : {data_ingestion_artifact}")
 
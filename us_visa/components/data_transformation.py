@@ -1,25 +1,24 @@
-import json 
 import sys
-import pandas as pd
 import numpy as np
 from pandas import DataFrame
 
 from us_visa.exception import VisaException
 from us_visa.logger import logging
 
-from imblearn.combine import SMOTEENN
 from sklearn.pipeline import Pipeline
 from sklearn.compose import ColumnTransformer
 from sklearn.preprocessing import StandardScaler, OrdinalEncoder, OneHotEncoder, PowerTransformer
 
-from us_visa.constant import CURRENT_YEAR, SCHEMA_FILE_PATH, TARGET_COLUMN
+from us_visa.constant import SCHEMA_FILE_PATH, TARGET_COLUMN
 
 from us_visa.entity.config_entity import DataTransformationConfig
 from us_visa.entity.artifact_entity import DataIngestionArtifact,DataValidationArtifact,DataTransformationArtifact
 
 from us_visa.entity.estimator import TargetValueMapping
+from us_visa.entity.compiled_preprocessor import CompiledPreprocessor
+from us_visa.entity.resampler import Resampler
 
-from us_visa.utils.main_utils import save_object,save_numpy_array_data,read_yaml_file,drop_columns
+from us_visa.utils.main_utils import save_object,save_numpy_array_data,read_yaml_file,drop_columns,read_dataframe,add_company_age
 
 
 class DataTransformation:
@@ -40,9 +39,9 @@ class DataTransformation:
             raise VisaException(e,sys)
     
     @staticmethod
-    def read_data(filepath)->DataFrame:
+    def read_data(filepath,schema_config:dict=None)->DataFrame:
         try:
-            return pd.read_csv(filepath)
+            return read_dataframe(filepath,schema_config=schema_config,stage='data_transformation')
         except Exception as e:
             raise VisaException(e,sys)
         
@@ -83,6 +82,31 @@ class DataTransformation:
             raise VisaException(e,sys)
 
 
+    def export_compiled_preprocessor(self,preprocessor:ColumnTransformer,dataframe:DataFrame):
+        """
+        Method Name : export_compiled_preprocessor
+        Description : this method compiles fitted preprocessor into lookup tables and saves it
+                      when its output matches preprocessor output on dataframe
+        Output      : compiled preprocessor filepath, None when it could not be exported
+        On failure  : write error log and raise exception
+        """
+        try:
+            try:
+                compiled_preprocessor = CompiledPreprocessor.from_column_transformer(preprocessor)
+            except ValueError as e:
+                logging.info(f"preprocessor can not be compiled: {e}")
+                return None
+
+            if not compiled_preprocessor.verify_parity(preprocessor,dataframe):
+                logging.info("compiled preprocessor does not match preprocessor output, not exporting it")
+                return None
+
+            save_object(self.data_transformation_config.compiled_object_filepath,compiled_preprocessor)
+            logging.info("saved compiled preprocessor object")
+            return self.data_transformation_config.compiled_object_filepath
+        except Exception as e:
+            raise VisaException(e,sys)
+
     def initiate_data_transformation(self)->DataTransformationArtifact:
         """
         Method Name : initiate_data_transformation
@@ -96,19 +120,24 @@ class DataTransformation:
                 preprocessor = self.get_data_transformer_object()
                 logging.info("got preprocessor object")
 
-                train_df = DataTransformation.read_data(self.data_ingestion_artifact.train_file_path)
-                test_df = DataTransformation.read_data(self.data_ingestion_artifact.test_file_path)
+                train_df = self.data_ingestion_artifact.train_df
+                if train_df is None:
+                    train_df = DataTransformation.read_data(self.data_ingestion_artifact.train_file_path,schema_config=self._schema_config)
+                test_df = self.data_ingestion_artifact.test_df
+                if test_df is None:
+                    test_df = DataTransformation.read_data(self.data_ingestion_artifact.test_file_path,schema_config=self._schema_config)
 
                 input_feature_train_df = train_df.drop(TARGET_COLUMN,axis=1)
                 target_column_train_df = train_df[TARGET_COLUMN]
 
                 logging.info("got input and target features of input dataframe")
 
-                input_feature_train_df['company_age'] = CURRENT_YEAR - input_feature_train_df['yr_of_estab']
+                input_feature_train_df = add_company_age(input_feature_train_df)
 
                 logging.info("added company age column")
 
-                drop_cols = self._schema_config['drop_columns']
+                # columns dropped by mongodb export are not present anymore
+                drop_cols = [column for column in self._schema_config['drop_columns'] if column in train_df.columns]
 
                 logging.info("drop columns in drop_cols of Training dataset")
 
@@ -121,7 +150,7 @@ class DataTransformation:
                 input_feature_test_df = test_df.drop(TARGET_COLUMN, axis=1)
                 target_feature_test_df = test_df[TARGET_COLUMN]
 
-                input_feature_test_df['company_age'] = CURRENT_YEAR - input_feature_test_df['yr_of_estab']
+                input_feature_test_df = add_company_age(input_feature_test_df)
 
                 logging.info("added company_age column to test dataset")
 
@@ -138,19 +167,19 @@ class DataTransformation:
                 input_features_train_arr = preprocessor.fit_transform(input_feature_train_df)
                 input_features_test_arr = preprocessor.transform(input_feature_test_df)
 
-                smt = SMOTEENN(sampling_strategy='minority')
+                resampler = Resampler.from_config_file(self.data_transformation_config.resampling_config_filepath)
 
-                input_feature_train_final,target_feature_train_final = smt.fit_resample(
-                    input_features_train_arr,target_column_train_df
+                input_feature_train_final,target_feature_train_final,train_resampling_report = resampler.fit_resample(
+                    input_features_train_arr,target_column_train_df,name="training"
                 )
 
-                logging.info("applied SMOTEEN on training dataset")
+                logging.info(f"applied {train_resampling_report['method']} on training dataset")
 
-                input_feature_test_final,target_feature_test_final = smt.fit_resample(
-                    input_features_test_arr,target_feature_test_df
+                input_feature_test_final,target_feature_test_final,test_resampling_report = resampler.fit_resample(
+                    input_features_test_arr,target_feature_test_df,name="test"
                 )
 
-                logging.info("applied SMOTEEN on test dataset")
+                logging.info(f"applied {test_resampling_report['method']} on test dataset")
 
                 train_arr = np.c_[input_feature_train_final,np.array(target_feature_train_final)]
                 test_arr = np.c_[input_feature_test_final,np.array(target_feature_test_final)]
@@ -163,10 +192,14 @@ class DataTransformation:
 
                 logging.info("saved the preprocessor object")
 
+                compiled_object_filepath = self.export_compiled_preprocessor(preprocessor,input_feature_train_df)
+
                 data_transformation_artifact = DataTransformationArtifact(
                     transformed_object_filepath=self.data_transformation_config.transformed_object_filepath,
                     transformed_train_filepath=self.data_transformation_config.transformed_train_filepath,
-                    transformed_test_filepath=self.data_transformation_config.transformed_test_filepath
+                    transformed_test_filepath=self.data_transformation_config.transformed_test_filepath,
+                    compiled_object_filepath=compiled_object_filepath,
+                    resampling_report={"training":train_resampling_report,"test":test_resampling_report}
                 )
                 logging.info(f"data transformation artifact: {data_transformation_artifact}")
                 return data_transformation_artifact
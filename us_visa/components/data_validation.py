@@ -1,17 +1,17 @@
-import os,sys,json
+import os,sys
+from concurrent.futures import ThreadPoolExecutor
 from pandas import DataFrame
-import pandas as pd
 
 from us_visa.exception import VisaException
 from us_visa.logger import logging
 
-from us_visa.utils.main_utils import write_yaml_file,read_yaml_file
+from us_visa.utils.main_utils import write_yaml_file,read_yaml_file,read_dataframe,add_company_age
 
 from us_visa.entity.config_entity import DataValidationConfig
 from us_visa.entity.artifact_entity import DataIngestionArtifact, DataValidationArtifact
 
-from evidently.model_profile import Profile
-from evidently.model_profile.sections import DataDriftProfileSection
+from us_visa.entity.drift_sketch import DriftSketch
+from us_visa.entity.schema_validator import SchemaValidator
 
 from us_visa.constant import SCHEMA_FILE_PATH
 
@@ -26,80 +26,105 @@ class DataValidation:
             self.data_ingestion_artifact = data_ingestion_artifact
             self.data_validation_config = data_validation_config
             self._schema_file = read_yaml_file(filepath=SCHEMA_FILE_PATH)
+            self._schema_validator = SchemaValidator.from_schema(self._schema_file)
         except Exception as e:
             raise VisaException(e,sys)
         
-    def validate_number_of_columns(self,dataframe : DataFrame)->bool:
+    def validate_schema(self,dataframe:DataFrame,name:str)->dict:
         """
-        Method Name : validate_number_of_columns
-        Description : this methoda validates number of columns of input dataframe
-        Output      : returns bool value based on validation result
+        Method Name : validate_schema
+        Description : this method checks columns, dtypes, missing values, categories and ranges of dataframe
+                      against schema in one vectorized pass
+        Output      : returns per column violation summary, summary['status'] is the validation result
         On failure  : log the error and raises exception
         """
         try:
-            status = len(dataframe.columns)==len(self._schema_file['columns'])
-            logging.info(f"is required columns present {status}")
-            return status
-        except Exception as e:
-            raise VisaException(e,sys)
-        
-    def is_column_exist(self,dataframe:DataFrame)->bool:
-        """
-        Method Name : is_column_exist
-        Description : this method validates existance of categorical and numerical columns
-        Output      : returns bool value based on validation result
-        On failure  : log error and raises exception
-        """
-        try:
-            dataframe_column = dataframe.columns
-            missing_numerical_columns = []
-            missing_categorical_columns = []
-
-            for column in self._schema_file['numerical_columns']:
-                if column not in dataframe_column:
-                    missing_numerical_columns.append(column)
-
-            if len(missing_numerical_columns)>0:
-                logging.info(f'missing numerical column {missing_numerical_columns}')
-
-            for column in self._schema_file['categorical_columns']:
-                if column not in dataframe_column:
-                    missing_categorical_columns.append(column)
-
-            if len(missing_categorical_columns)>0:
-                logging.info(f"missing categorical column {missing_categorical_columns}")
-            
-            return False if len(missing_categorical_columns)>0 or len(missing_numerical_columns)>0 else True
+            summary = self._schema_validator.validate(dataframe,max_violation_share=self.data_validation_config.max_violation_share)
+            for column,column_summary in summary['columns'].items():
+                if column_summary['n_violations'] > 0 or not column_summary['dtype_ok']:
+                    logging.info(f"{name} column {column}: dtype {column_summary['dtype']} ok {column_summary['dtype_ok']}, "
+                                 f"{column_summary['n_violations']} violations, examples {column_summary['examples']}")
+            if len(summary['missing_columns']) > 0:
+                logging.info(f"missing columns in {name} dataset {summary['missing_columns']}")
+            if len(summary['unexpected_columns']) > 0:
+                logging.info(f"unexpected columns in {name} dataset {summary['unexpected_columns']}")
+            logging.info(f"{name} dataset matches schema {summary['status']}")
+            return summary
         except Exception as e:
             raise VisaException(e,sys)
         
     @staticmethod
-    def read_data(filepath)->DataFrame:
+    def read_data(filepath,schema_config:dict=None)->DataFrame:
         try:
-            return pd.read_csv(filepath)
+            return read_dataframe(filepath,schema_config=schema_config,stage='data_validation')
         except Exception as e:
             raise VisaException(e,sys)
+
+    def get_train_test_data(self):
+        """
+        returns train and test dataframes handed over by data ingestion, files are read concurrently when run standalone
+        """
+        artifact = self.data_ingestion_artifact
+        if artifact.train_df is not None and artifact.test_df is not None:
+            return artifact.train_df,artifact.test_df
+
+        def read(dataframe,filepath):
+            return dataframe if dataframe is not None else DataValidation.read_data(filepath=filepath,schema_config=self._schema_file)
+
+        with ThreadPoolExecutor(max_workers=max(1,min(2,self.data_validation_config.n_workers))) as executor:
+            train_future = executor.submit(read,artifact.train_df,artifact.train_file_path)
+            test_future = executor.submit(read,artifact.test_df,artifact.test_file_path)
+            return train_future.result(),test_future.result()
     
-    def detect_dataset_drift(self,reference_df:DataFrame,current_df:DataFrame)->bool:
+    def get_drift_columns(self,dataframe:DataFrame):
+        """
+        returns numerical and categorical columns of dataframe which are checked for drift, identifiers are skipped
+        """
+        id_columns = self._schema_file.get('id_columns',[])
+        numerical_columns = [column for column in dict.fromkeys(self._schema_file['numerical_columns'] + self._schema_file['num_features'])
+                             if column in dataframe.columns and column not in id_columns]
+        categorical_columns = [column for column in self._schema_file['categorical_columns']
+                               if column in dataframe.columns and column not in id_columns]
+        return numerical_columns,categorical_columns
+
+    def build_reference_sketch(self,reference_df:DataFrame)->DriftSketch:
+        """
+        builds drift sketch of reference data and saves it, so later runs and serving can compare against it
+        company_age is sketched as well because it is the form in which serving receives yr_of_estab
+        """
+        reference_df = add_company_age(reference_df)
+        numerical_columns,categorical_columns = self.get_drift_columns(reference_df)
+        reference_sketch = DriftSketch.from_dataframe(reference_df,numerical_columns,categorical_columns,
+                                                      n_bins=self.data_validation_config.sketch_bins,
+                                                      n_workers=self.data_validation_config.n_workers)
+        os.makedirs(os.path.dirname(self.data_validation_config.reference_sketch_filepath),exist_ok=True)
+        reference_sketch.save(self.data_validation_config.reference_sketch_filepath)
+        return reference_sketch
+
+    def detect_dataset_drift(self,reference_df:DataFrame,current_df:DataFrame,reference_sketch:DriftSketch=None)->bool:
         """
         Method Name : detect_dataset_drift
-        Description : this method detects drift in dataset
+        Description : this method detects drift of current data against sketch of reference data
         Output      : returns bool based on drift result
         On failure  : log error and raises exception
         """
         try:
-            data_drift_profile = Profile(sections=[DataDriftProfileSection()])
-            data_drift_profile.calculate(reference_df,current_df)
-
-            report = data_drift_profile.json()
-            json_report = json.loads(report)
+            if reference_sketch is None:
+                reference_sketch = self.build_reference_sketch(reference_df)
+            config = self.data_validation_config
+            json_report = reference_sketch.compare(add_company_age(current_df),
+                                                   drift_share=config.drift_share,
+                                                   psi_threshold=config.psi_threshold,
+                                                   p_value_threshold=config.p_value_threshold,
+                                                   stat_test_max_rows=config.stat_test_max_rows,
+                                                   n_workers=config.n_workers)
 
             write_yaml_file(filepath=self.data_validation_config.drift_report_filepath,obj=json_report)
 
             n_features = json_report['data_drift']['data']['metrics']['n_features']
             n_drifted_features = json_report['data_drift']['data']['metrics']['n_drifted_features']
 
-            logging.info(f"{n_features}/{n_drifted_features} drift detected")
+            logging.info(f"{n_drifted_features}/{n_features} drift detected")
 
             drift_status = json_report['data_drift']['data']['metrics']['dataset_drift']
             return drift_status
@@ -116,31 +141,31 @@ class DataValidation:
         try:
             validation_error_msg = ""
             logging.info("starting data validation")
-            train_df,test_df = (DataValidation.read_data(filepath=self.data_ingestion_artifact.train_file_path),
-                                DataValidation.read_data(filepath=self.data_ingestion_artifact.test_file_path))
+            train_df,test_df = self.get_train_test_data()
             
-            status = self.validate_number_of_columns(dataframe=train_df)
-            logging.info(f"all required columns are present in training dataset {status}")
-            if not status:
-                validation_error_msg += "columns are missing in training dataset"
-
-            status = self.validate_number_of_columns(dataframe=test_df)
-            logging.info(f"all required columns are present in test dataset {status}")
-            if not status:
-                validation_error_msg += "columns are missing in test dataset"
-
-            status = self.is_column_exist(train_df)
-            if not status:
-                validation_error_msg += "columns are missing in training dataset"
-
-            status = self.is_column_exist(test_df)
-            if not status:
-                validation_error_msg += "columns are missing in test dataset"
+            # train and test are checked in parallel, the validator keeps no state in validate
+            with ThreadPoolExecutor(max_workers=max(1,min(2,self.data_validation_config.n_workers))) as executor:
+                schema_report = dict(zip(("training","test"),executor.map(self.validate_schema,(train_df,test_df),("training","test"))))
+            for name,summary in schema_report.items():
+                if len(summary['missing_columns']) > 0:
+                    validation_error_msg += f"columns are missing in {name} dataset"
+                if not summary['status']:
+                    validation_error_msg += f"{name} dataset does not match schema"
+            write_yaml_file(filepath=self.data_validation_config.schema_report_filepath,obj=schema_report)
 
             validation_status = len(validation_error_msg)==0
 
             if validation_status:
-                drift_status = self.detect_dataset_drift(train_df,test_df)
+                baseline_sketch_filepath = self.data_validation_config.baseline_sketch_filepath
+                if baseline_sketch_filepath is not None and os.path.exists(baseline_sketch_filepath):
+                    logging.info(f"checking training data for drift against baseline sketch {baseline_sketch_filepath}")
+                    with ThreadPoolExecutor(max_workers=max(1,min(2,self.data_validation_config.n_workers))) as executor:
+                        drift_future = executor.submit(self.detect_dataset_drift,None,train_df,DriftSketch.load(baseline_sketch_filepath))
+                        sketch_future = executor.submit(self.build_reference_sketch,train_df)
+                        drift_status = drift_future.result()
+                        sketch_future.result()
+                else:
+                    drift_status = self.detect_dataset_drift(train_df,test_df)
                 
                 if drift_status:
                     logging.info('drift detected')
@@ -154,7 +179,9 @@ class DataValidation:
             data_validation_artifact = DataValidationArtifact(
                 validation_status=validation_status,
                 message=validation_error_msg,
-                drift_report_filepath=self.data_validation_config.drift_report_filepath
+                drift_report_filepath=self.data_validation_config.drift_report_filepath,
+                reference_sketch_filepath=self.data_validation_config.reference_sketch_filepath if validation_status else None,
+                schema_report_filepath=self.data_validation_config.schema_report_filepath
             )
             logging.info(f"data validation artifact: {data_validation_artifact}")
             return data_validation_artifact
@@ -1,17 +1,16 @@
 import sys
-import pandas as pd
 from sklearn.metrics import f1_score
 
 from us_visa.exception import VisaException
 from us_visa.logger import logging
 
-from us_visa.constant import TARGET_COLUMN, CURRENT_YEAR
+from us_visa.constant import TARGET_COLUMN, SCHEMA_FILE_PATH
+from us_visa.utils.main_utils import read_dataframe, read_yaml_file, get_dataframe_columns, add_company_age
 from us_visa.entity.config_entity import ModelEvaluationConfig
 from us_visa.entity.artifact_entity import ModelEvaluationArtifact, DataIngestionArtifact, ModelTrainerArtifact
 
 from us_visa.entity.s3_estimator import USvisaEstimator
 from dataclasses import dataclass
-from us_visa.entity.estimator import USvisaModel
 from us_visa.entity.estimator import TargetValueMapping
 
 @dataclass
@@ -29,6 +28,7 @@ class ModelEvaluation:
             self.model_eval_config = model_eval_config
             self.data_ingestion_artifact = data_ingestion_artifact
             self.model_trainer_artifact = model_trainer_artifact
+            self._schema_config = read_yaml_file(filepath=SCHEMA_FILE_PATH)
         except Exception as e:
             raise VisaException(e,sys)
         
@@ -59,8 +59,19 @@ class ModelEvaluation:
         On failure  : writes exception log and raises exception
         """
         try:
-            test_df = pd.read_csv(self.data_ingestion_artifact.train_file_path)
-            test_df['company_age']=CURRENT_YEAR-test_df['yr_of_estab']
+            # only model inputs, yr_of_estab for company_age and target are read
+            train_df = self.data_ingestion_artifact.train_df
+            available_columns = train_df.columns if train_df is not None else \
+                get_dataframe_columns(self.data_ingestion_artifact.train_file_path)
+            columns = [column for column in self._schema_config['oh_columns'] + self._schema_config['or_columns'] +
+                       self._schema_config['num_features'] + ['yr_of_estab',TARGET_COLUMN] if column in available_columns]
+            if train_df is not None:
+                test_df = train_df[columns]
+            else:
+                test_df = read_dataframe(self.data_ingestion_artifact.train_file_path,columns=columns,
+                                         schema_config=self._schema_config,stage='model_evaluation')
+            # add_company_age returns new frame, the handed over dataframe is shared with earlier stages
+            test_df = add_company_age(test_df)
 
             x,y = test_df.drop(TARGET_COLUMN,axis=1),test_df[TARGET_COLUMN]
             y = y.replace(TargetValueMapping()._asdict())
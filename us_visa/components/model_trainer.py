@@ -9,17 +9,21 @@ from us_visa.logger import logging
 
 from us_visa.utils.main_utils import load_numpy_array_data,load_object,save_object
 from us_visa.entity.config_entity import ModelTrainerConfig
-from us_visa.entity.artifact_entity import DataTransformationArtifact,ModelTrainerArtifact,ClassificationMetric
+from us_visa.entity.artifact_entity import DataTransformationArtifact,ModelTrainerArtifact,ClassificationMetric,DataValidationArtifact
 from us_visa.entity.estimator import USvisaModel
+from us_visa.entity.drift_sketch import DriftSketch
 
 class ModelTrainer:
-    def __init__(self, data_transformation_artifact:DataTransformationArtifact,model_trainer_config:ModelTrainerConfig):
+    def __init__(self, data_transformation_artifact:DataTransformationArtifact,model_trainer_config:ModelTrainerConfig,
+                 data_validation_artifact:DataValidationArtifact=None):
         """
         :Param data_transformation_artifact : Output component of data transformation stage
         :Param model_trainer_config : Configuration for ModelTrainer
+        :Param data_validation_artifact : Output component of data validation stage, its reference sketch is packed with the model
         """
         self.data_transformation_artifact = data_transformation_artifact
         self.model_trainer_config = model_trainer_config
+        self.data_validation_artifact = data_validation_artifact
 
     def get_model_object_and_report(self,train_arr:np.array,test_arr:np.array):
         """
@@ -69,11 +73,22 @@ class ModelTrainer:
 
             preprocessing_obj = load_object(self.data_transformation_artifact.transformed_object_filepath)
 
+            compiled_preprocessing_obj = None
+            if self.data_transformation_artifact.compiled_object_filepath is not None:
+                compiled_preprocessing_obj = load_object(self.data_transformation_artifact.compiled_object_filepath)
+
             if best_model_detail.best_score < self.model_trainer_config.expected_accuracy:
                 logging.info("No best model found with score more than best score")
                 raise Exception("No best model found with score more than best score")
             
-            usvisa_model = USvisaModel(preprocessing_obj=preprocessing_obj,trained_model_obj=best_model_detail.best_model)
+            reference_sketch = None
+            if self.data_validation_artifact is not None and self.data_validation_artifact.reference_sketch_filepath is not None:
+                reference_sketch = DriftSketch.load(self.data_validation_artifact.reference_sketch_filepath)
+
+            usvisa_model = USvisaModel(preprocessing_obj=preprocessing_obj,
+                                       trained_model_obj=best_model_detail.best_model,
+                                       compiled_preprocessing_obj=compiled_preprocessing_obj,
+                                       reference_sketch=reference_sketch)
 
             logging.info("created usvisa model object with preprocessor and model")
 
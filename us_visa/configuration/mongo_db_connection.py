@@ -18,9 +18,10 @@ class MongodbClient:
                 if mongo_db_url is None:
                     raise Exception(f"environment key {MONGODB_URL_KEY} is not set")
                 MongodbClient.client = pymongo.MongoClient(mongo_db_url)
-                self.client = MongodbClient.client
-                self.database = self.client[database_name]
-                self.database_name = database_name
                 logging.info("mongodb connection succesfull")
+            # every instance shares the client and its connection pool
+            self.client = MongodbClient.client
+            self.database = self.client[database_name]
+            self.database_name = database_name
         except Exception as e:
             raise VisaException(e,sys)
\ No newline at end of file
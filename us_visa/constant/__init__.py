@@ -12,8 +12,11 @@ MODEL_FILE_NAME = 'model.pkl'
 PIPELINE_NAME = 'usvisa'
 
 TARGET_COLUMN = 'case_status'
+# set by data loader on every write of a document, not a feature
+UPDATED_AT_FIELD = 'updated_at'
 CURRENT_YEAR = date.today().year
 PREPROCESSING_OBJECT_FILE_NAME = 'preprocessor.pkl'
+COMPILED_PREPROCESSING_OBJECT_FILE_NAME = 'compiled_preprocessor.pkl'
 FILENAME = 'usvisa.csv'
 TRAIN_FILE_NAME = 'train.csv'
 TEST_FILE_NAME = 'test.csv'
@@ -33,6 +36,22 @@ DATA_INGESTION_DIR_NAME = 'data_ingestion'
 DATA_INGESTION_FEATURE_STORE_DIR = 'feature_store'
 DATA_INGESTION_INGESTED_DIR = 'ingested'
 DATA_INGESTION_TRAIN_TEST_SPLIT_RATIO = 0.2
+DATA_INGESTION_FILE_FORMAT = 'parquet'
+DATA_INGESTION_CURSOR_BATCH_SIZE = 10000
+DATA_INGESTION_EXPORT_PARALLELISM = 4
+DATA_INGESTION_SPLIT_MODE = 'hash'
+DATA_INGESTION_SPLIT_KEY_COLUMN = 'case_id'
+DATA_INGESTION_STREAMING = False
+DATA_INGESTION_STREAM_CHUNK_SIZE = 50000
+DATA_INGESTION_SERVER_SIDE_FEATURES = False
+DATA_INGESTION_SAMPLE_METHOD = 'sample'
+DATA_INGESTION_SAMPLE_SEED = 42
+DATA_INGESTION_PARTITION_FIELD = '_id'
+DATA_INGESTION_INCREMENTAL = False
+DATA_INGESTION_WATERMARK_FIELD = UPDATED_AT_FIELD
+DATA_INGESTION_KEY_COLUMN = 'case_id'
+DATA_INGESTION_PERSISTENT_FEATURE_STORE_DIR = 'feature_store'
+DATA_INGESTION_WATERMARK_FILE_NAME = 'watermark.yaml'
 
 """
 Data validation constants name starts with DATA_VALIDATION VAR name
@@ -41,6 +60,16 @@ Data validation constants name starts with DATA_VALIDATION VAR name
 DATA_VALIDATION_DIR = 'data_validation'
 DATA_VALIDATION_DRIFT_REPORT_DIR = 'drift_report'
 DATA_VALIDATION_DRIFT_REPORT_FILENAME = 'drift.yaml'
+DATA_VALIDATION_REFERENCE_SKETCH_FILENAME = 'reference_sketch.json'
+DATA_VALIDATION_SKETCH_BINS = 10
+DATA_VALIDATION_DRIFT_SHARE = 0.5
+DATA_VALIDATION_PSI_THRESHOLD = 0.1
+DATA_VALIDATION_P_VALUE_THRESHOLD = 0.05
+DATA_VALIDATION_STAT_TEST_MAX_ROWS = 1000
+DATA_VALIDATION_SCHEMA_REPORT_DIR = 'schema_report'
+DATA_VALIDATION_SCHEMA_REPORT_FILENAME = 'schema_report.yaml'
+DATA_VALIDATION_MAX_VIOLATION_SHARE = 0.01
+DATA_VALIDATION_N_WORKERS = 4
 
 """
 Data transformation constants name starts with DATA_TRANSFORMATION VAR name
@@ -49,6 +78,7 @@ Data transformation constants name starts with DATA_TRANSFORMATION VAR name
 DATA_TRANSFORMATION_DIR_NAME = 'data_transformation'
 DATA_TRANSFORMATION_TRANSFORMED_DATA_DIR = 'transformed'
 DATA_TRANSFORMATION_TRANSFORMED_OBJECT_DIR = 'transformed_object'
+DATA_TRANSFORMATION_RESAMPLING_CONFIG_FILE_PATH = os.path.join('config','resampling.yaml')
 
 """
 Model trainer constants name starts with MODEL_TRAINER VAR name
@@ -64,6 +94,51 @@ MODEL_EVALUATION_CHANGED_THRESHOLD_SCORE : float = 0.02
 MODEL_BUCKET_NAME = "usvisa-model-jatin"
 MODEL_PUSHER_S3_KEY = "model-registry"
 
+"""
+Prediction constants name starts with PREDICTION VAR name
+"""
+PREDICTION_MODEL_REFRESH_INTERVAL = 60
+PREDICTION_MAX_BATCH_SIZE = 1000
+PREDICTION_BATCHING_ENABLED = False
+PREDICTION_BATCHING_MAX_WAIT_MS = 5
+PREDICTION_BATCHING_MAX_RECORDS = 256
+PREDICTION_CACHE_ENABLED = True
+PREDICTION_CACHE_MAX_SIZE = 100000
+PREDICTION_CACHE_TTL_SECONDS = 3600
+PREDICTION_PRELOAD_RETRY_INTERVAL = 10
+PREDICTION_DRIFT_MONITOR_ENABLED = True
+PREDICTION_DRIFT_CHECK_INTERVAL = 60
+PREDICTION_DRIFT_MIN_RECORDS = 500
+PREDICTION_DRIFT_WINDOW_RECORDS = 100000
+PREDICTION_WARM_UP_RECORDS = [
+    {"continent":"Asia","education_of_employee":"Master's","has_job_experience":"Y",
+     "requires_job_training":"N","no_of_employees":2412,"region_of_employment":"Northeast",
+     "prevailing_wage":83425.65,"unit_of_wage":"Year","full_time_position":"Y","company_age":22},
+    {"continent":"Europe","education_of_employee":"High School","has_job_experience":"N",
+     "requires_job_training":"Y","no_of_employees":44,"region_of_employment":"West",
+     "prevailing_wage":592.2029,"unit_of_wage":"Hour","full_time_position":"N","company_age":9}
+]
+
+"""
+Batch prediction constants name starts with BATCH_PREDICTION VAR name
+"""
+BATCH_PREDICTION_CHUNK_SIZE = 100000
+BATCH_PREDICTION_ID_COLUMN = 'case_id'
+
+
+"""
+Training job constants name starts with TRAINING_JOB VAR name
+"""
+TRAINING_JOB_DIR_NAME = 'training_jobs'
+TRAINING_JOB_LOCK_FILE_NAME = 'active_job.lock'
+
+
+"""
+Data loader constants name starts with DATA_LOADER VAR name
+"""
+DATA_LOADER_CHUNK_SIZE = 50000
+DATA_LOADER_BATCH_SIZE = 1000
+DATA_LOADER_KEY_COLUMN = 'case_id'
 
 APP_HOST = "0.0.0.0"
 APP_PORT = 8080
\ No newline at end of file
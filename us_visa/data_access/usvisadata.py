@@ -1,7 +1,13 @@
 from us_visa.configuration.mongo_db_connection import MongodbClient
 from us_visa.exception import VisaException
-from us_visa.constant import DATABASE_NAME
+from us_visa.constant import DATABASE_NAME, SCHEMA_FILE_PATH, DATA_INGESTION_CURSOR_BATCH_SIZE, CURRENT_YEAR, \
+    UPDATED_AT_FIELD
+from us_visa.logger import logging
+from us_visa.utils.main_utils import read_yaml_file
 import sys
+import random
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 import pandas as pd
 import numpy as np
 
@@ -14,25 +20,300 @@ class UsVisaData:
     def __init__(self):
         try:
             self.client = MongodbClient(DATABASE_NAME)
+            self._schema_config = read_yaml_file(filepath=SCHEMA_FILE_PATH)
+            self._column_dtypes = {column:dtype for column_dtype in self._schema_config['columns'] for column,dtype in column_dtype.items()}
         except Exception as e:
             raise VisaException(e,sys)
-        
-    def export_data_as_dataframe(self,collection_name:str,database_name = None)->pd.DataFrame:
+
+    def get_collection(self,collection_name:str,database_name = None):
+        if database_name is None:
+            return self.client.database[collection_name]
+        return self.client.client[database_name][collection_name]
+
+    def find(self,collection_name:str,database_name = None,query:dict = None,batch_size:int = DATA_INGESTION_CURSOR_BATCH_SIZE,
+             include_fields:list = None,sort:list = None):
+        """
+        returns cursor over documents matching query, _id and updated_at are projected out on the server
+        unless they are in include_fields
+        """
+        collection = self.get_collection(collection_name,database_name)
+        projection = {field:False for field in ('_id',UPDATED_AT_FIELD) if field not in (include_fields or [])} or None
+        cursor = collection.find(query or {},projection=projection,batch_size=batch_size)
+        if sort is not None:
+            cursor = cursor.sort(sort)
+        return cursor
+
+    def aggregate(self,collection_name:str,pipeline:list,database_name = None,query:dict = None,
+                  batch_size:int = DATA_INGESTION_CURSOR_BATCH_SIZE,sort:list = None):
+        """
+        returns cursor over documents matching query and transformed by pipeline stages on the server
+        """
+        collection = self.get_collection(collection_name,database_name)
+        stages = []
+        if query:
+            stages.append({'$match':query})
+        if sort is not None:
+            stages.append({'$sort':dict(sort)})
+        return collection.aggregate(stages + pipeline,batchSize=batch_size,allowDiskUse=True)
+
+    def iter_documents(self,collection_name:str,database_name = None,query:dict = None,
+                       batch_size:int = DATA_INGESTION_CURSOR_BATCH_SIZE,sort:list = None,pipeline:list = None):
+        """
+        returns cursor of find, or of aggregate when pipeline stages are given
+        """
+        if pipeline is None:
+            return self.find(collection_name,database_name,query=query,batch_size=batch_size,sort=sort)
+        return self.aggregate(collection_name,pipeline,database_name,query=query,batch_size=batch_size,sort=sort)
+
+    def get_feature_pipeline(self,keep_columns:list = None)->list:
+        """
+        returns aggregation stages which make training ready documents on the server: 'na' becomes null,
+        company_age is derived from yr_of_estab and drop_columns of schema are removed except keep_columns
+        """
+        keep_columns = keep_columns or []
+        drop_columns = [column for column in self._schema_config['drop_columns'] if column not in keep_columns]
+        projection = {'_id':0}
+        for column in self._column_dtypes:
+            if column not in drop_columns:
+                projection[column] = {'$cond':[{'$eq':[f'${column}','na']},None,f'${column}']}
+        projection['company_age'] = {'$cond':[{'$isNumber':'$yr_of_estab'},{'$subtract':[CURRENT_YEAR,'$yr_of_estab']},None]}
+        return [{'$project':projection}]
+
+    def _to_column(self,column:str,values:list)->pd.Series:
+        """
+        converts accumulated values of column into typed series, 'na' and missing values become NaN
+        """
+        values = [np.nan if value is None or value == 'na' else value for value in values]
+        if self._column_dtypes.get(column) == 'int':
+            try:
+                array = np.array(values,dtype=np.float64)
+                if not np.isnan(array).any() and np.array_equal(array,np.floor(array)):
+                    array = array.astype(np.int64)
+                return pd.Series(array,name=column)
+            except (TypeError,ValueError):
+                pass
+        return pd.Series(values,name=column)
+
+    def _accumulate_columns(self,documents):
+        """
+        collects values of documents column by column so documents are released as soon as they are read
+        returns dict of column to list of values and number of documents
+        """
+        columns = {}
+        n_rows = 0
+        for document in documents:
+            for key,value in document.items():
+                values = columns.get(key)
+                if values is None:
+                    values = columns[key] = [None]*n_rows
+                values.append(value)
+            n_rows += 1
+            if len(document) != len(columns):
+                for values in columns.values():
+                    if len(values) < n_rows:
+                        values.append(None)
+        return columns,n_rows
+
+    def _columns_to_dataframe(self,columns:dict)->pd.DataFrame:
+        data = {}
+        for column in list(columns):
+            data[column] = self._to_column(column,columns.pop(column))
+        return pd.DataFrame(data)
+
+    def documents_to_dataframe(self,documents)->pd.DataFrame:
+        """
+        builds dataframe from iterable of documents, values are accumulated column by column
+        so documents are released as soon as they are read
+        """
+        columns,_ = self._accumulate_columns(documents)
+        return self._columns_to_dataframe(columns)
+
+    def get_partition_queries(self,collection_name:str,partition_field:str,n_partitions:int,
+                              database_name = None,query:dict = None)->list:
         """
-        export entire data as dataframe
+        splits documents matching query into at most n_partitions contiguous ranges of partition_field
+        boundaries are read from the index on partition_field, ranges are returned in ascending order
+        and together cover every document matching query
+        partition_field should hold values of a single bson type, _id always does
         """
         try:
-            if database_name is None:
-                collection = self.client.database[collection_name]
-            else:
-                collection = self.client[database_name][collection_name]
+            collection = self.get_collection(collection_name,database_name)
+            base_query = query or {}
+            n_documents = collection.count_documents(base_query)
+            n_partitions = max(1,min(n_partitions,n_documents))
 
-            df = pd.DataFrame(list(collection.find()))
+            boundaries = []
+            for partition in range(1,n_partitions):
+                cursor = collection.find(base_query,projection={partition_field:True}) \
+                    .sort(partition_field,1).skip(partition*n_documents//n_partitions).limit(1)
+                for document in cursor:
+                    boundary = document.get(partition_field)
+                    if boundary is not None and (len(boundaries) == 0 or boundary > boundaries[-1]):
+                        boundaries.append(boundary)
 
-            if '_id' in df.columns.to_list():
-                df = df.drop('_id',axis=1)
-            df.replace({'na':np.nan},inplace=True)
-            return df
+            ranges = []
+            lower = None
+            for upper in boundaries + [None]:
+                condition = {}
+                if lower is not None:
+                    condition['$gte'] = lower
+                if upper is not None:
+                    condition['$lt'] = upper
+                ranges.append({partition_field:condition} if condition else {})
+                lower = upper
+            if partition_field != '_id' and len(ranges) > 1:
+                # range conditions never match null or missing values, they sort before every other value
+                ranges.insert(0,{partition_field:None})
+
+            return [{'$and':[base_query,range_query]} if base_query else range_query for range_query in ranges]
         except Exception as e:
             raise VisaException(e,sys)
 
+    def export_data_in_partitions(self,collection_name:str,n_partitions:int,partition_field:str = '_id',
+                                  database_name = None,query:dict = None,
+                                  batch_size:int = DATA_INGESTION_CURSOR_BATCH_SIZE,pipeline:list = None)->pd.DataFrame:
+        """
+        export data as dataframe reading ranges of partition_field concurrently, one cursor per range
+        threads share the connection pool of MongodbClient. Partitions are concatenated in range order
+        and typed once after concatenation, so the result equals the sequential export of documents
+        ordered by partition_field
+        """
+        try:
+            partition_queries = self.get_partition_queries(collection_name,partition_field,n_partitions,
+                                                           database_name=database_name,query=query)
+            logging.info(f"exporting {collection_name} in {len(partition_queries)} partitions of {partition_field}")
+
+            def read_partition(partition_query):
+                cursor = self.iter_documents(collection_name,database_name,query=partition_query,batch_size=batch_size,
+                                             sort=[(partition_field,1)],pipeline=pipeline)
+                return self._accumulate_columns(cursor)
+
+            with ThreadPoolExecutor(max_workers=len(partition_queries)) as executor:
+                partitions = list(executor.map(read_partition,partition_queries))
+
+            columns = {}
+            n_rows = 0
+            for partition_columns,partition_rows in partitions:
+                for column in partition_columns:
+                    if column not in columns:
+                        columns[column] = [None]*n_rows
+                for column,values in columns.items():
+                    values.extend(partition_columns.pop(column,None) or [None]*partition_rows)
+                n_rows += partition_rows
+            return self._columns_to_dataframe(columns)
+        except Exception as e:
+            raise VisaException(e,sys)
+
+    def export_data_as_dataframe(self,collection_name:str,database_name = None,query:dict = None,
+                                 batch_size:int = DATA_INGESTION_CURSOR_BATCH_SIZE,
+                                 parallelism:int = 1,partition_field:str = '_id',pipeline:list = None)->pd.DataFrame:
+        """
+        export entire data as dataframe ordered by partition_field, with parallelism above 1 ranges of partition_field
+        are read concurrently, so rows come out in the same order for any parallelism
+        pipeline stages, when given, are applied to documents on the server
+        """
+        try:
+            if parallelism > 1:
+                return self.export_data_in_partitions(collection_name,n_partitions=parallelism,
+                                                      partition_field=partition_field,database_name=database_name,
+                                                      query=query,batch_size=batch_size,pipeline=pipeline)
+            cursor = self.iter_documents(collection_name,database_name,query=query,batch_size=batch_size,
+                                         sort=[(partition_field,1)],pipeline=pipeline)
+            return self.documents_to_dataframe(cursor)
+        except Exception as e:
+            raise VisaException(e,sys)
+
+    def get_stratum_sizes(self,collection_name:str,stratify_column:str,sample_size:int = None,fraction:float = None,
+                          database_name = None)->dict:
+        """
+        returns number of documents to sample for every value of stratify_column, proportional to its share
+        of the collection, every non empty stratum gets at least one document
+        """
+        collection = self.get_collection(collection_name,database_name)
+        counts = {value:collection.count_documents({stratify_column:value})
+                  for value in sorted(collection.distinct(stratify_column),key=str)}
+        total = sum(counts.values())
+        if sample_size is None:
+            sample_size = round(total*fraction)
+        sample_size = min(sample_size,total)
+        return {value:min(count,max(1,round(sample_size*count/total))) for value,count in counts.items() if count > 0}
+
+    def export_sample_as_dataframe(self,collection_name:str,stratify_column:str,sample_size:int = None,fraction:float = None,
+                                   method:str = 'sample',seed:int = None,database_name = None,
+                                   batch_size:int = DATA_INGESTION_CURSOR_BATCH_SIZE,pipeline:list = None)->pd.DataFrame:
+        """
+        export stratified random sample of sample_size documents, or fraction of the collection, as dataframe
+        method 'sample' draws every stratum with $sample on the server, method 'reservoir' keeps one
+        reservoir per stratum over a single streaming cursor and is repeatable for a given seed
+        """
+        try:
+            stratum_sizes = self.get_stratum_sizes(collection_name,stratify_column,sample_size=sample_size,
+                                                   fraction=fraction,database_name=database_name)
+            logging.info(f"sampling {sum(stratum_sizes.values())} documents by {method}, per {stratify_column}: {stratum_sizes}")
+            pipeline = pipeline if pipeline is not None else [{'$project':{'_id':0,UPDATED_AT_FIELD:0}}]
+
+            if method == 'sample':
+                documents = []
+                for value,size in stratum_sizes.items():
+                    documents.extend(self.aggregate(collection_name,[{'$sample':{'size':size}}] + pipeline,database_name,
+                                                    query={stratify_column:value},batch_size=batch_size))
+                return self.documents_to_dataframe(documents)
+
+            rng = random.Random(seed)
+            reservoirs = {value:[] for value in stratum_sizes}
+            n_seen = dict.fromkeys(stratum_sizes,0)
+            for document in self.iter_documents(collection_name,database_name,batch_size=batch_size,
+                                                sort=[('_id',1)],pipeline=pipeline):
+                value = document.get(stratify_column)
+                reservoir = reservoirs.get(value)
+                if reservoir is None:
+                    continue
+                n_seen[value] += 1
+                if len(reservoir) < stratum_sizes[value]:
+                    reservoir.append(document)
+                else:
+                    index = rng.randrange(n_seen[value])
+                    if index < stratum_sizes[value]:
+                        reservoir[index] = document
+            return self.documents_to_dataframe(document for reservoir in reservoirs.values() for document in reservoir)
+        except Exception as e:
+            raise VisaException(e,sys)
+
+    def export_data_after_watermark(self,collection_name:str,watermark_field:str,watermark = None,database_name = None,
+                                    batch_size:int = DATA_INGESTION_CURSOR_BATCH_SIZE):
+        """
+        export documents whose watermark_field is greater than watermark, all documents when watermark is None
+        returns dataframe and highest watermark_field value read (watermark itself when nothing is new),
+        _id and updated_at are not part of the returned dataframe
+        """
+        try:
+            query = {} if watermark is None else {watermark_field:{'$gt':watermark}}
+            cursor = self.find(collection_name,database_name,query=query,batch_size=batch_size,
+                               include_fields=[watermark_field],sort=[(watermark_field,1)])
+            dataframe = self.documents_to_dataframe(cursor)
+
+            # documents without watermark_field sort first, so the last value is the highest when any is set
+            new_watermark = watermark
+            if watermark_field in dataframe.columns and len(dataframe) > 0 and not pd.isna(dataframe[watermark_field].iloc[-1]):
+                new_watermark = dataframe[watermark_field].iloc[-1]
+                if isinstance(new_watermark,pd.Timestamp):
+                    new_watermark = new_watermark.to_pydatetime()
+            dataframe = dataframe.drop(columns=[column for column in ('_id',UPDATED_AT_FIELD) if column in dataframe.columns])
+            return dataframe,new_watermark
+        except Exception as e:
+            raise VisaException(e,sys)
+
+    def export_data_in_chunks(self,collection_name:str,chunk_size:int,database_name = None,query:dict = None,
+                              batch_size:int = DATA_INGESTION_CURSOR_BATCH_SIZE,pipeline:list = None):
+        """
+        export data as iterator of dataframes with at most chunk_size rows
+        """
+        try:
+            cursor = self.iter_documents(collection_name,database_name,query=query,batch_size=batch_size,pipeline=pipeline)
+            while True:
+                dataframe = self.documents_to_dataframe(islice(cursor,chunk_size))
+                if len(dataframe) == 0:
+                    break
+                yield dataframe
+        except Exception as e:
+            raise VisaException(e,sys)
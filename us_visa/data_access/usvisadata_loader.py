@@ -0,0 +1,167 @@
+import sys
+import time
+import math
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pyarrow.parquet as pq
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+
+from us_visa.configuration.mongo_db_connection import MongodbClient
+from us_visa.constant import UPDATED_AT_FIELD
+from us_visa.entity.config_entity import DataLoaderConfig
+from us_visa.entity.artifact_entity import DataLoadArtifact
+from us_visa.exception import VisaException
+from us_visa.logger import logging
+
+
+class UsVisaDataLoader:
+    """
+    This class loads a csv or parquet file of visa applications into mongodb. The file is read in chunks,
+    every document is upserted on the key column with unordered bulk writes and batches are written
+    in parallel, so loading the same file again leaves the data unchanged. Every written document gets
+    the server time in updated_at, incremental ingestion uses it as watermark to find inserts and updates
+    """
+    def __init__(self,data_loader_config:DataLoaderConfig):
+        """
+        :param data_loader_config: configuration for data loader
+        """
+        try:
+            self.data_loader_config = data_loader_config
+            self.collection = MongodbClient(data_loader_config.database_name).database[data_loader_config.collection_name]
+        except Exception as e:
+            raise VisaException(e,sys)
+
+    def create_key_index(self):
+        """
+        Method Name : create_key_index
+        Description : this method creates index on key column so every upsert is an index lookup,
+                      index is unique unless the collection already holds duplicate keys
+        """
+        key_column = self.data_loader_config.key_column
+        try:
+            self.collection.create_index(key_column,unique=True)
+        except OperationFailure as e:
+            logging.info(f"unique index on {key_column} not created, collection has duplicate keys: {e}")
+            self.collection.create_index(key_column)
+
+    def iter_chunks(self):
+        """
+        Method Name : iter_chunks
+        Description : this method reads input file in chunks of chunk_size rows
+        """
+        input_file_path = self.data_loader_config.input_file_path
+        chunk_size = self.data_loader_config.chunk_size
+        if input_file_path.endswith('.parquet'):
+            for batch in pq.ParquetFile(input_file_path).iter_batches(batch_size=chunk_size):
+                yield batch.to_pandas()
+        else:
+            yield from pd.read_csv(input_file_path,chunksize=chunk_size)
+
+    def iter_batches(self):
+        """
+        yields (operations, number of documents without key) for every batch_size documents of input file
+        """
+        key_column = self.data_loader_config.key_column
+        batch_size = self.data_loader_config.batch_size
+        for chunk in self.iter_chunks():
+            documents = chunk.to_dict(orient='records')
+            for start in range(0,len(documents),batch_size):
+                operations = []
+                n_missing_key = 0
+                for document in documents[start:start + batch_size]:
+                    key = document.get(key_column)
+                    if key is None or (isinstance(key,float) and math.isnan(key)):
+                        n_missing_key += 1
+                        continue
+                    operations.append(UpdateOne({key_column:key},{'$set':document,'$currentDate':{UPDATED_AT_FIELD:True}},
+                                                upsert=True))
+                yield operations,n_missing_key
+
+    def write_batch(self,operations:list)->dict:
+        """
+        writes one unordered bulk of upserts, failed documents do not stop the rest of the batch
+        """
+        counts = {"n_upserted":0,"n_modified":0,"n_matched":0,"n_failed":0}
+        if len(operations) == 0:
+            return counts
+        try:
+            result = self.collection.bulk_write(operations,ordered=False)
+            counts.update(n_upserted=result.upserted_count,n_modified=result.modified_count,n_matched=result.matched_count)
+        except BulkWriteError as e:
+            details = e.details
+            counts.update(n_upserted=details.get('nUpserted',0),n_modified=details.get('nModified',0),
+                          n_matched=details.get('nMatched',0),n_failed=len(details.get('writeErrors',[])))
+            logging.info(f"{counts['n_failed']} documents failed in bulk write, first error: {details['writeErrors'][0].get('errmsg')}")
+        return counts
+
+    def initiate_data_load(self)->DataLoadArtifact:
+        """
+        Method Name : initiate_data_load
+        Description : this method loads input file into mongodb collection
+        Output      : returns data load artifact with document counts and throughput
+        On failure  : writes error log and raises exception
+        """
+        try:
+            config = self.data_loader_config
+            logging.info(f"loading {config.input_file_path} into {config.database_name}.{config.collection_name}")
+            self.create_key_index()
+
+            totals = {"n_read":0,"n_upserted":0,"n_modified":0,"n_matched":0,"n_failed":0}
+
+            def add_counts(counts:dict):
+                for key,value in counts.items():
+                    totals[key] += value
+
+            # at most two batches per worker are in flight, this bounds memory for any input size
+            max_pending = 2*config.n_workers
+            pending = deque()
+            start_time = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=config.n_workers) as executor:
+                for operations,n_missing_key in self.iter_batches():
+                    totals["n_read"] += len(operations) + n_missing_key
+                    totals["n_failed"] += n_missing_key
+                    pending.append(executor.submit(self.write_batch,operations))
+                    if len(pending) >= max_pending:
+                        add_counts(pending.popleft().result())
+                while pending:
+                    add_counts(pending.popleft().result())
+
+            elapsed_seconds = time.perf_counter() - start_time
+            data_load_artifact = DataLoadArtifact(
+                n_read=totals["n_read"],
+                n_upserted=totals["n_upserted"],
+                n_modified=totals["n_modified"],
+                n_unchanged=totals["n_matched"] - totals["n_modified"],
+                n_failed=totals["n_failed"],
+                elapsed_seconds=elapsed_seconds,
+                documents_per_second=totals["n_read"]/elapsed_seconds if elapsed_seconds > 0 else 0.0
+            )
+            logging.info(f"data load artifact: {data_load_artifact}")
+            return data_load_artifact
+        except Exception as e:
+            raise VisaException(e,sys)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="load a csv or parquet file of usvisa applications into mongodb")
+    parser.add_argument("input_file_path")
+    parser.add_argument("--collection",default=DataLoaderConfig.collection_name)
+    parser.add_argument("--key-column",default=DataLoaderConfig.key_column)
+    parser.add_argument("--chunk-size",type=int,default=DataLoaderConfig.chunk_size)
+    parser.add_argument("--batch-size",type=int,default=DataLoaderConfig.batch_size)
+    parser.add_argument("--workers",type=int,default=DataLoaderConfig.n_workers)
+    args = parser.parse_args()
+
+    data_loader = UsVisaDataLoader(DataLoaderConfig(input_file_path=args.input_file_path,
+                                                    collection_name=args.collection,
+                                                    key_column=args.key_column,
+                                                    chunk_size=args.chunk_size,
+                                                    batch_size=args.batch_size,
+                                                    n_workers=args.workers))
+    artifact = data_loader.initiate_data_load()
+    print(f"read {artifact.n_read} documents in {artifact.elapsed_seconds:.2f}s ({artifact.documents_per_second:.0f} docs/sec): "
+          f"{artifact.n_upserted} inserted, {artifact.n_modified} updated, {artifact.n_unchanged} unchanged, {artifact.n_failed} failed")
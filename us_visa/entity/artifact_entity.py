@@ -1,20 +1,30 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Optional
+from pandas import DataFrame
 @dataclass
 class DataIngestionArtifact:
     train_file_path : str
     test_file_path : str
+    # frames already loaded in this process, later stages read the files only when these are None
+    train_df : Optional[DataFrame] = field(default=None,repr=False,compare=False)
+    test_df : Optional[DataFrame] = field(default=None,repr=False,compare=False)
 
 @dataclass
 class DataValidationArtifact:
     validation_status : bool
     message : str
     drift_report_filepath : str
+    reference_sketch_filepath : Optional[str] = None
+    schema_report_filepath : Optional[str] = None
 
 @dataclass
 class DataTransformationArtifact:
     transformed_train_filepath : str
     transformed_test_filepath : str
     transformed_object_filepath : str
+    compiled_object_filepath : Optional[str] = None
+    # method, row counts and seconds of resampling per dataset
+    resampling_report : Optional[dict] = None
 
 @dataclass
 class ClassificationMetric:
@@ -37,4 +47,21 @@ class ModelEvaluationArtifact:
 @dataclass
 class ModelPusherArtifact:
     bucket_name : str
-    s3_model_path : str
\ No newline at end of file
+    s3_model_path : str
+
+@dataclass
+class BatchPredictionArtifact:
+    output_file_path : str
+    n_rows : int
+    elapsed_seconds : float
+    rows_per_second : float
+
+@dataclass
+class DataLoadArtifact:
+    n_read : int
+    n_upserted : int
+    n_modified : int
+    n_unchanged : int
+    n_failed : int
+    elapsed_seconds : float
+    documents_per_second : float
@@ -0,0 +1,170 @@
+import sys
+
+import numpy as np
+from pandas import DataFrame
+from sklearn.compose import ColumnTransformer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder, PowerTransformer, StandardScaler
+
+from us_visa.exception import VisaException
+from us_visa.logger import logging
+
+
+class CompiledPreprocessor:
+    """
+    This class holds a fitted ColumnTransformer compiled into plain lookup tables and arrays,
+    so a raw record can be turned into the feature vector without sklearn validation overhead
+    """
+    def __init__(self,blocks:list,n_features:int):
+        """
+        :param blocks : list of compiled transformer blocks in output order
+        :param n_features : number of columns produced by the preprocessor
+        """
+        self.blocks = blocks
+        self.n_features = n_features
+
+    @classmethod
+    def from_column_transformer(cls,preprocessor:ColumnTransformer)->"CompiledPreprocessor":
+        """
+        compiles fitted preprocessor, raises ValueError for transformers which are not supported so callers
+        can fall back to the preprocessor itself, other errors are raised as VisaException
+        """
+        try:
+            blocks = []
+            for name,transformer,columns in preprocessor.transformers_:
+                if transformer == 'drop' or len(columns) == 0:
+                    continue
+                if transformer == 'passthrough':
+                    raise ValueError(f"passthrough columns of {name} are not supported")
+                steps = [step for _,step in transformer.steps] if isinstance(transformer,Pipeline) else [transformer]
+                blocks.append(cls._compile_steps(list(columns),steps))
+
+            n_features = sum(block['width'] for block in blocks)
+            logging.info(f"compiled preprocessor with {len(blocks)} blocks and {n_features} features")
+            return cls(blocks=blocks,n_features=n_features)
+        except ValueError:
+            raise
+        except Exception as e:
+            raise VisaException(e,sys)
+
+    @staticmethod
+    def _compile_steps(columns:list,steps:list)->dict:
+        if len(steps) == 1 and isinstance(steps[0],OneHotEncoder):
+            encoder = steps[0]
+            if encoder.drop is not None:
+                raise ValueError("OneHotEncoder with drop is not supported")
+            lookups = [{category:index for index,category in enumerate(categories)} for categories in encoder.categories_]
+            return {'kind':'onehot',
+                    'columns':columns,
+                    'lookups':lookups,
+                    'ignore_unknown':encoder.handle_unknown != 'error',
+                    'width':sum(len(lookup) for lookup in lookups)}
+
+        if len(steps) == 1 and isinstance(steps[0],OrdinalEncoder):
+            encoder = steps[0]
+            lookups = [{category:float(index) for index,category in enumerate(categories)} for categories in encoder.categories_]
+            return {'kind':'ordinal','columns':columns,'lookups':lookups,'width':len(columns)}
+
+        operations = []
+        for step in steps:
+            if isinstance(step,PowerTransformer):
+                if step.method != 'yeo-johnson':
+                    raise ValueError(f"PowerTransformer method {step.method} is not supported")
+                operations.append(('yeo_johnson',np.asarray(step.lambdas_,dtype=float)))
+                if step.standardize:
+                    operations.append(('scale',step._scaler.mean_,step._scaler.scale_))
+            elif isinstance(step,StandardScaler):
+                operations.append(('scale',step.mean_,step.scale_))
+            else:
+                raise ValueError(f"{type(step).__name__} is not supported")
+        return {'kind':'numeric','columns':columns,'operations':operations,'width':len(columns)}
+
+    @staticmethod
+    def _yeo_johnson(x:np.ndarray,lmbda:float)->np.ndarray:
+        # same formula as sklearn PowerTransformer._yeo_johnson_transform
+        out = np.zeros_like(x)
+        pos = x >= 0
+        eps = np.spacing(1.0)
+        if abs(lmbda) < eps:
+            out[pos] = np.log1p(x[pos])
+        else:
+            out[pos] = (np.power(x[pos] + 1,lmbda) - 1)/lmbda
+        if abs(lmbda - 2) > eps:
+            out[~pos] = -(np.power(-x[~pos] + 1,2 - lmbda) - 1)/(2 - lmbda)
+        else:
+            out[~pos] = -np.log1p(-x[~pos])
+        return out
+
+    def _transform_columns(self,values:dict,n_rows:int)->np.ndarray:
+        output = np.zeros((n_rows,self.n_features),dtype=np.float64)
+        rows = np.arange(n_rows)
+        offset = 0
+        for block in self.blocks:
+            if block['kind'] == 'onehot':
+                for column,lookup in zip(block['columns'],block['lookups']):
+                    for row,value in enumerate(values[column]):
+                        index = lookup.get(value)
+                        if index is not None:
+                            output[row,offset + index] = 1.0
+                        elif not block['ignore_unknown']:
+                            raise ValueError(f"found unknown category {value!r} in column {column}")
+                    offset += len(lookup)
+            elif block['kind'] == 'ordinal':
+                for column,lookup in zip(block['columns'],block['lookups']):
+                    try:
+                        output[rows,offset] = [lookup[value] for value in values[column]]
+                    except KeyError as e:
+                        raise ValueError(f"found unknown category {e.args[0]!r} in column {column}")
+                    offset += 1
+            else:
+                block_values = np.column_stack([np.asarray(values[column],dtype=np.float64) for column in block['columns']])
+                for operation in block['operations']:
+                    if operation[0] == 'yeo_johnson':
+                        for index,lmbda in enumerate(operation[1]):
+                            block_values[:,index] = self._yeo_johnson(block_values[:,index],lmbda)
+                    else:
+                        _,mean,scale = operation
+                        block_values = (block_values - mean)/scale
+                output[:,offset:offset + block['width']] = block_values
+                offset += block['width']
+        return output
+
+    def transform_record(self,record:dict)->np.ndarray:
+        """
+        transforms one raw record (feature name to value) into a feature array of shape (1, n_features)
+        """
+        try:
+            return self._transform_columns({column:[value] for column,value in record.items()},n_rows=1)
+        except Exception as e:
+            raise VisaException(e,sys)
+
+    def transform(self,dataframe:DataFrame)->np.ndarray:
+        """
+        transforms raw dataframe into feature array, same output as preprocessor.transform
+        """
+        try:
+            columns = {column for block in self.blocks for column in block['columns']}
+            values = {column:dataframe[column].to_numpy() for column in columns}
+            return self._transform_columns(values,n_rows=len(dataframe))
+        except Exception as e:
+            raise VisaException(e,sys)
+
+    def verify_parity(self,preprocessor:ColumnTransformer,dataframe:DataFrame,atol:float=1e-8)->bool:
+        """
+        checks that compiled output matches preprocessor.transform on dataframe
+        """
+        try:
+            expected = preprocessor.transform(dataframe)
+            if hasattr(expected,'toarray'):
+                expected = expected.toarray()
+            actual = self.transform(dataframe)
+
+            if expected.shape != actual.shape:
+                logging.info(f"compiled preprocessor shape {actual.shape} does not match {expected.shape}")
+                return False
+
+            max_difference = float(np.max(np.abs(expected - actual))) if expected.size > 0 else 0.0
+            logging.info(f"compiled preprocessor max absolute difference {max_difference}")
+            return bool(np.allclose(expected,actual,rtol=0,atol=atol))
+        except Exception as e:
+            raise VisaException(e,sys)
@@ -17,16 +17,54 @@ training_pipeline_config : TrainingPipelineConfig = TrainingPipelineConfig()
 @dataclass
 class DataIngestionConfig:
     data_ingestion_dir : str = os.path.join(training_pipeline_config.artifact_dir,DATA_INGESTION_DIR_NAME)
-    feature_store_file_path : str = os.path.join(data_ingestion_dir,DATA_INGESTION_FEATURE_STORE_DIR,FILENAME)
-    training_file_path : str = os.path.join(data_ingestion_dir,DATA_INGESTION_INGESTED_DIR,TRAIN_FILE_NAME)
-    test_file_path : str = os.path.join(data_ingestion_dir,DATA_INGESTION_INGESTED_DIR,TEST_FILE_NAME)
+    feature_store_file_path : str = os.path.join(data_ingestion_dir,DATA_INGESTION_FEATURE_STORE_DIR,FILENAME.replace('csv',DATA_INGESTION_FILE_FORMAT))
+    training_file_path : str = os.path.join(data_ingestion_dir,DATA_INGESTION_INGESTED_DIR,TRAIN_FILE_NAME.replace('csv',DATA_INGESTION_FILE_FORMAT))
+    test_file_path : str = os.path.join(data_ingestion_dir,DATA_INGESTION_INGESTED_DIR,TEST_FILE_NAME.replace('csv',DATA_INGESTION_FILE_FORMAT))
     train_test_split_ratio = DATA_INGESTION_TRAIN_TEST_SPLIT_RATIO
     collection_name : str = DATA_INGESTION_COLLECTION_NAME
+    cursor_batch_size : int = DATA_INGESTION_CURSOR_BATCH_SIZE
+    export_parallelism : int = DATA_INGESTION_EXPORT_PARALLELISM
+    partition_field : str = DATA_INGESTION_PARTITION_FIELD
+    split_mode : str = DATA_INGESTION_SPLIT_MODE
+    split_key_column : str = DATA_INGESTION_SPLIT_KEY_COLUMN
+    streaming : bool = DATA_INGESTION_STREAMING
+    stream_chunk_size : int = DATA_INGESTION_STREAM_CHUNK_SIZE
+    server_side_features : bool = DATA_INGESTION_SERVER_SIDE_FEATURES
+    # sampled run when sample_size or sample_fraction is set, sample is stratified by target column
+    sample_size : int = None
+    sample_fraction : float = None
+    sample_method : str = DATA_INGESTION_SAMPLE_METHOD
+    sample_seed : int = DATA_INGESTION_SAMPLE_SEED
+    sample_stratify_column : str = TARGET_COLUMN
+    incremental : bool = DATA_INGESTION_INCREMENTAL
+    full_refresh : bool = False
+    watermark_field : str = DATA_INGESTION_WATERMARK_FIELD
+    key_column : str = DATA_INGESTION_KEY_COLUMN
+    persistent_feature_store_dir : str = os.path.join(ARTIFACT_DIR,DATA_INGESTION_PERSISTENT_FEATURE_STORE_DIR)
+    persistent_feature_store_file_path : str = os.path.join(persistent_feature_store_dir,FILENAME.replace('csv',DATA_INGESTION_FILE_FORMAT))
+    watermark_file_path : str = os.path.join(persistent_feature_store_dir,DATA_INGESTION_WATERMARK_FILE_NAME)
+
+    @property
+    def is_sampled(self)->bool:
+        return self.sample_size is not None or self.sample_fraction is not None
 
 @dataclass
 class DataValidationConfig:
     data_validation_dir : str = os.path.join(training_pipeline_config.artifact_dir,DATA_VALIDATION_DIR)
     drift_report_filepath : str = os.path.join(data_validation_dir,DATA_VALIDATION_DRIFT_REPORT_DIR,DATA_VALIDATION_DRIFT_REPORT_FILENAME)
+    reference_sketch_filepath : str = os.path.join(data_validation_dir,DATA_VALIDATION_DRIFT_REPORT_DIR,DATA_VALIDATION_REFERENCE_SKETCH_FILENAME)
+    # sketch saved by an earlier run, training data is compared against it instead of test data when set
+    baseline_sketch_filepath : str = None
+    sketch_bins : int = DATA_VALIDATION_SKETCH_BINS
+    drift_share : float = DATA_VALIDATION_DRIFT_SHARE
+    psi_threshold : float = DATA_VALIDATION_PSI_THRESHOLD
+    p_value_threshold : float = DATA_VALIDATION_P_VALUE_THRESHOLD
+    stat_test_max_rows : int = DATA_VALIDATION_STAT_TEST_MAX_ROWS
+    schema_report_filepath : str = os.path.join(data_validation_dir,DATA_VALIDATION_SCHEMA_REPORT_DIR,DATA_VALIDATION_SCHEMA_REPORT_FILENAME)
+    # share of rows of a column allowed to hold missing, unknown or out of range values
+    max_violation_share : float = DATA_VALIDATION_MAX_VIOLATION_SHARE
+    # threads for reading train and test, schema checks and per column drift, 1 runs everything in sequence
+    n_workers : int = DATA_VALIDATION_N_WORKERS
 
 @dataclass
 class DataTransformationConfig:
@@ -34,6 +72,8 @@ class DataTransformationConfig:
     transformed_train_filepath : str = os.path.join(data_transformation_dir,DATA_TRANSFORMATION_TRANSFORMED_DATA_DIR,TRAIN_FILE_NAME.replace('csv','npy'))
     transformed_test_filepath : str = os.path.join(data_transformation_dir,DATA_TRANSFORMATION_TRANSFORMED_DATA_DIR,TEST_FILE_NAME.replace('csv','npy'))
     transformed_object_filepath : str = os.path.join(data_transformation_dir,DATA_TRANSFORMATION_TRANSFORMED_OBJECT_DIR,PREPROCESSING_OBJECT_FILE_NAME)
+    compiled_object_filepath : str = os.path.join(data_transformation_dir,DATA_TRANSFORMATION_TRANSFORMED_OBJECT_DIR,COMPILED_PREPROCESSING_OBJECT_FILE_NAME)
+    resampling_config_filepath : str = DATA_TRANSFORMATION_RESAMPLING_CONFIG_FILE_PATH
 
 @dataclass
 class ModelTrainerConfig:
@@ -57,4 +97,42 @@ class ModelPusherConfig:
 class USvisaPredictorConfig:
     model_file_path : str = MODEL_FILE_NAME
     model_bucket_name : str = MODEL_BUCKET_NAME
-    
\ No newline at end of file
+    model_refresh_interval : int = PREDICTION_MODEL_REFRESH_INTERVAL
+    max_batch_size : int = PREDICTION_MAX_BATCH_SIZE
+    batching_enabled : bool = PREDICTION_BATCHING_ENABLED
+    batching_max_wait_ms : float = PREDICTION_BATCHING_MAX_WAIT_MS
+    batching_max_records : int = PREDICTION_BATCHING_MAX_RECORDS
+    prediction_cache_enabled : bool = PREDICTION_CACHE_ENABLED
+    prediction_cache_max_size : int = PREDICTION_CACHE_MAX_SIZE
+    prediction_cache_ttl_seconds : float = PREDICTION_CACHE_TTL_SECONDS
+    preload_retry_interval : float = PREDICTION_PRELOAD_RETRY_INTERVAL
+    drift_monitor_enabled : bool = PREDICTION_DRIFT_MONITOR_ENABLED
+    drift_check_interval : float = PREDICTION_DRIFT_CHECK_INTERVAL
+    drift_min_records : int = PREDICTION_DRIFT_MIN_RECORDS
+    drift_window_records : int = PREDICTION_DRIFT_WINDOW_RECORDS
+    
+@dataclass
+class BatchPredictionConfig:
+    input_file_path : str
+    output_file_path : str
+    chunk_size : int = BATCH_PREDICTION_CHUNK_SIZE
+    n_workers : int = os.cpu_count() or 1
+    id_column : str = BATCH_PREDICTION_ID_COLUMN
+    model_file_path : str = MODEL_FILE_NAME
+    model_bucket_name : str = MODEL_BUCKET_NAME
+    local_model_file_path : str = None
+
+@dataclass
+class DataLoaderConfig:
+    input_file_path : str
+    database_name : str = DATABASE_NAME
+    collection_name : str = COLLECTION_NAME
+    key_column : str = DATA_LOADER_KEY_COLUMN
+    chunk_size : int = DATA_LOADER_CHUNK_SIZE
+    batch_size : int = DATA_LOADER_BATCH_SIZE
+    n_workers : int = os.cpu_count() or 1
+
+@dataclass
+class TrainingJobConfig:
+    training_job_dir : str = os.path.join(ARTIFACT_DIR,TRAINING_JOB_DIR_NAME)
+    lock_file_path : str = os.path.join(training_job_dir,TRAINING_JOB_LOCK_FILE_NAME)
@@ -0,0 +1,204 @@
+import sys
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from pandas import DataFrame
+from scipy import stats
+
+from us_visa.exception import VisaException
+from us_visa.logger import logging
+
+# floor for bin shares so empty bins do not make psi or chi-square infinite
+MIN_SHARE = 1e-4
+
+
+def map_columns(function,columns:list,n_workers:int)->list:
+    """
+    returns [function(column) for column in columns], run on a thread pool when n_workers > 1
+    numpy and pandas release the gil in the per column work, results keep the order of columns
+    """
+    if n_workers <= 1 or len(columns) <= 1:
+        return [function(column) for column in columns]
+    with ThreadPoolExecutor(max_workers=min(n_workers,len(columns))) as executor:
+        return list(executor.map(function,columns))
+
+
+class DriftSketch:
+    """
+    This class keeps a compact summary of a reference dataset, quantile bin edges and counts for numerical
+    columns and category counts for categorical columns, and compares other data against it for drift
+    """
+    def __init__(self,numerical:dict,categorical:dict,n_rows:int):
+        """
+        :param numerical : column -> {'edges': inner bin edges, 'counts': counts per bin, 'missing': missing count}
+        :param categorical : column -> {'categories': reference categories, 'counts': counts per category, 'missing': missing count}
+        :param n_rows : number of rows of reference data
+        """
+        self.numerical = numerical
+        self.categorical = categorical
+        self.n_rows = n_rows
+
+    @classmethod
+    def from_dataframe(cls,dataframe:DataFrame,numerical_columns:list,categorical_columns:list,n_bins:int,
+                       n_workers:int = 1)->"DriftSketch":
+        """
+        builds sketch of reference dataframe, numerical columns are binned by reference quantiles
+        with n_workers > 1 columns are sketched in parallel threads
+        """
+        try:
+            numerical = dict(zip(numerical_columns,map_columns(lambda column:cls._sketch_numerical(dataframe[column],n_bins),
+                                                              numerical_columns,n_workers)))
+            categorical = dict(zip(categorical_columns,map_columns(lambda column:cls._sketch_categorical(dataframe[column]),
+                                                                  categorical_columns,n_workers)))
+            return cls(numerical=numerical,categorical=categorical,n_rows=len(dataframe))
+        except Exception as e:
+            raise VisaException(e,sys)
+
+    @classmethod
+    def _sketch_numerical(cls,series,n_bins:int)->dict:
+        values = series.to_numpy(dtype=np.float64)
+        present = values[~np.isnan(values)]
+        edges = np.unique(np.quantile(present,np.linspace(0,1,n_bins + 1)[1:-1])) if len(present) > 0 else np.array([])
+        return {'edges':edges.tolist(),
+                'counts':cls._bin_counts(present,edges).tolist(),
+                'missing':int(len(values) - len(present))}
+
+    @staticmethod
+    def _sketch_categorical(series)->dict:
+        value_counts = series.astype(object).value_counts(dropna=True)
+        return {'categories':[str(category) for category in value_counts.index],
+                'counts':[int(count) for count in value_counts.to_numpy()],
+                'missing':int(series.isna().sum())}
+
+    @staticmethod
+    def _bin_counts(values:np.ndarray,edges)->np.ndarray:
+        return np.bincount(np.searchsorted(edges,values,side='right'),minlength=len(edges) + 1)
+
+    def get_current_counts(self,dataframe:DataFrame,column:str)->np.ndarray:
+        """
+        returns counts of dataframe[column] in bins (numerical) or categories of reference (categorical),
+        unseen categories are counted in an extra last bucket
+        """
+        if column in self.numerical:
+            values = dataframe[column].to_numpy(dtype=np.float64)
+            return self._bin_counts(values[~np.isnan(values)],self.numerical[column]['edges'])
+
+        categories = self.categorical[column]['categories']
+        values = dataframe[column].dropna().astype(str)
+        value_counts = values.value_counts()
+        counts = np.array([value_counts.get(category,0) for category in categories] + [0],dtype=np.int64)
+        counts[-1] = len(values) - counts[:-1].sum()
+        return counts
+
+    @staticmethod
+    def psi(reference_counts:np.ndarray,current_counts:np.ndarray)->float:
+        reference_share = np.clip(reference_counts/max(reference_counts.sum(),1),MIN_SHARE,None)
+        current_share = np.clip(current_counts/max(current_counts.sum(),1),MIN_SHARE,None)
+        return float(np.sum((current_share - reference_share)*np.log(current_share/reference_share)))
+
+    @staticmethod
+    def ks_p_value(reference_counts:np.ndarray,current_counts:np.ndarray)->float:
+        """
+        two sample kolmogorov-smirnov p-value with the statistic taken at bin edges
+        """
+        n_reference,n_current = reference_counts.sum(),current_counts.sum()
+        if n_reference == 0 or n_current == 0:
+            return 1.0
+        statistic = np.max(np.abs(np.cumsum(reference_counts)/n_reference - np.cumsum(current_counts)/n_current))
+        return float(stats.kstwobign.sf(statistic*np.sqrt(n_reference*n_current/(n_reference + n_current))))
+
+    @staticmethod
+    def chi_square_p_value(reference_counts:np.ndarray,current_counts:np.ndarray)->float:
+        if current_counts.sum() == 0:
+            return 1.0
+        expected_share = np.clip(reference_counts/max(reference_counts.sum(),1),MIN_SHARE,None)
+        expected = expected_share/expected_share.sum()*current_counts.sum()
+        return float(stats.chisquare(current_counts,expected).pvalue)
+
+    def compare(self,dataframe:DataFrame,drift_share:float,psi_threshold:float,p_value_threshold:float,
+                stat_test_max_rows:int,n_workers:int = 1)->dict:
+        """
+        Method Name : compare
+        Description : this method tests every sketched column of dataframe for drift, see compare_counts
+                      with n_workers > 1 columns are counted in parallel threads
+        Output      : drift report of compare_counts
+        """
+        try:
+            columns = [column for column in list(self.numerical) + list(self.categorical) if column in dataframe.columns]
+            current_counts = dict(zip(columns,map_columns(lambda column:self.get_current_counts(dataframe,column),columns,n_workers)))
+            return self.compare_counts(current_counts,drift_share=drift_share,psi_threshold=psi_threshold,
+                                       p_value_threshold=p_value_threshold,stat_test_max_rows=stat_test_max_rows)
+        except Exception as e:
+            raise VisaException(e,sys)
+
+    def compare_counts(self,current_counts:dict,drift_share:float,psi_threshold:float,p_value_threshold:float,
+                       stat_test_max_rows:int)->dict:
+        """
+        Method Name : compare_counts
+        Description : this method tests current counts, column -> counts laid out as by get_current_counts, for drift.
+                      With at most stat_test_max_rows reference rows a statistical test is used (ks for numerical,
+                      chi-square for categorical) and drift is p-value below p_value_threshold, with more rows
+                      drift is psi of at least psi_threshold
+        Output      : drift report with data_drift.data.metrics holding per column results and dataset_drift, which is
+                      True when share of drifted columns is at least drift_share
+        """
+        try:
+            use_stat_test = self.n_rows <= stat_test_max_rows
+            metrics = {}
+            for column,feature_type in [(column,'num') for column in self.numerical] + [(column,'cat') for column in self.categorical]:
+                if column not in current_counts:
+                    continue
+                sketch = self.numerical[column] if feature_type == 'num' else self.categorical[column]
+                reference_counts = np.asarray(sketch['counts'],dtype=np.int64)
+                current_counts_of_column = np.asarray(current_counts[column],dtype=np.int64)
+                if feature_type == 'cat':
+                    reference_counts = np.append(reference_counts,0)
+
+                if use_stat_test:
+                    if feature_type == 'num':
+                        stattest_name,drift_score = 'K-S p_value',self.ks_p_value(reference_counts,current_counts_of_column)
+                    else:
+                        stattest_name,drift_score = 'chi-square p_value',self.chi_square_p_value(reference_counts,current_counts_of_column)
+                    threshold,drift_detected = p_value_threshold,drift_score < p_value_threshold
+                else:
+                    stattest_name,drift_score = 'PSI',self.psi(reference_counts,current_counts_of_column)
+                    threshold,drift_detected = psi_threshold,drift_score >= psi_threshold
+
+                metrics[column] = {'column_name':column,
+                                   'column_type':feature_type,
+                                   'stattest_name':stattest_name,
+                                   'drift_score':round(drift_score,6),
+                                   'threshold':threshold,
+                                   'drift_detected':bool(drift_detected)}
+
+            n_features = len(metrics)
+            n_drifted_features = sum(1 for metric in metrics.values() if metric['drift_detected'])
+            share_drifted_features = n_drifted_features/n_features if n_features > 0 else 0.0
+            return {'data_drift':{'data':{'metrics':{'n_features':n_features,
+                                                     'n_drifted_features':n_drifted_features,
+                                                     'share_drifted_features':share_drifted_features,
+                                                     'dataset_drift':bool(n_features > 0 and share_drifted_features >= drift_share),
+                                                     'columns':metrics}}}}
+        except Exception as e:
+            raise VisaException(e,sys)
+
+    def to_dict(self)->dict:
+        return {'n_rows':self.n_rows,'numerical':self.numerical,'categorical':self.categorical}
+
+    @classmethod
+    def from_dict(cls,sketch:dict)->"DriftSketch":
+        return cls(numerical=sketch['numerical'],categorical=sketch['categorical'],n_rows=sketch['n_rows'])
+
+    def save(self,filepath:str):
+        with open(filepath,'w') as file_obj:
+            json.dump(self.to_dict(),file_obj)
+        logging.info(f"saved drift sketch of {len(self.numerical) + len(self.categorical)} columns to {filepath}")
+
+    @classmethod
+    def load(cls,filepath:str)->"DriftSketch":
+        try:
+            with open(filepath) as file_obj:
+                return cls.from_dict(json.load(file_obj))
+        except Exception as e:
+            raise VisaException(e,sys)
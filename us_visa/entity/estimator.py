@@ -1,6 +1,7 @@
 import sys
 from us_visa.exception import VisaException
 from us_visa.logger import logging
+from us_visa.utils.metrics import time_stage
 
 from pandas import DataFrame
 from sklearn.pipeline import Pipeline
@@ -18,13 +19,26 @@ class TargetValueMapping:
         return dict(zip(mapping_response.values(),mapping_response.keys()))
     
 class USvisaModel:
-    def __init__(self,preprocessing_obj:Pipeline,trained_model_obj:object):
+    def __init__(self,preprocessing_obj:Pipeline,trained_model_obj:object,compiled_preprocessing_obj:object=None,
+                 reference_sketch:object=None):
         """
         :param preprocessing_obj : input object of preprocessor
         :param trained_model_obj : input object of model
+        :param compiled_preprocessing_obj : preprocessor compiled into lookup tables, used for single rows
+        :param reference_sketch : drift sketch of training data, live traffic is compared against it
         """
         self.preprocessor_object = preprocessing_obj
         self.model_object = trained_model_obj
+        self.compiled_preprocessor_object = compiled_preprocessing_obj
+        self.reference_sketch = reference_sketch
+
+    def get_compiled_preprocessor(self):
+        # models pickled before compiled preprocessor was introduced do not have the attribute
+        return getattr(self,'compiled_preprocessor_object',None)
+
+    def get_reference_sketch(self):
+        # models pickled before drift sketches were introduced do not have the attribute
+        return getattr(self,'reference_sketch',None)
     
     def predict(self,dataframe:DataFrame)->DataFrame:
         """
@@ -34,9 +48,32 @@ class USvisaModel:
         """  
         try:
             logging.info("entered predict method of USvisaModel")
-            transformed_features = self.preprocessor_object.transform(dataframe)
+            compiled_preprocessor = self.get_compiled_preprocessor()
+            with time_stage("transform"):
+                if compiled_preprocessor is not None and len(dataframe) == 1:
+                    transformed_features = compiled_preprocessor.transform(dataframe)
+                else:
+                    transformed_features = self.preprocessor_object.transform(dataframe)
+
+            with time_stage("predict"):
+                return self.model_object.predict(transformed_features)
+        except Exception as e:
+            raise VisaException(e,sys)
+
+    def predict_record(self,record:dict):
+        """
+        Function accepts one raw record as dict of feature name to value and returns its prediction
+        it skips DataFrame creation when compiled preprocessor is available
+        """
+        try:
+            compiled_preprocessor = self.get_compiled_preprocessor()
+            if compiled_preprocessor is None:
+                return self.predict(DataFrame({column:[value] for column,value in record.items()}))[0]
 
-            return self.model_object.predict(transformed_features)
+            with time_stage("transform"):
+                transformed_features = compiled_preprocessor.transform_record(record)
+            with time_stage("predict"):
+                return self.model_object.predict(transformed_features)[0]
         except Exception as e:
             raise VisaException(e,sys)
 
@@ -0,0 +1,117 @@
+import sys
+import threading
+
+from us_visa.cloud_storage.aws_storage import SimpleStorageService
+from us_visa.entity.estimator import USvisaModel
+from us_visa.exception import VisaException
+from us_visa.logger import logging
+from us_visa.utils.metrics import set_model_version
+
+
+class USvisaModelCache:
+    """
+    This class keeps one loaded usvisa model per s3 model path for the whole process.
+    A background thread checks version of the model object in s3 bucket and hot swaps
+    the model when a new one is pushed
+    """
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self,bucket_name,model_path,refresh_interval):
+        """
+        :param bucket_name : name of the bucket
+        :param model_path : path of the model in s3_bucket
+        :param refresh_interval : seconds between version checks, 0 or less disables the check
+        """
+        self.bucket_name = bucket_name
+        self.model_path = model_path
+        self.refresh_interval = refresh_interval
+        self.s3 = SimpleStorageService()
+
+        # version and model are swapped together as one tuple so readers never see a mixed pair
+        self._current = (None,None)
+        self._load_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._refresh_thread = None
+
+    @classmethod
+    def get_instance(cls,bucket_name,model_path,refresh_interval)->"USvisaModelCache":
+        """
+        returns shared cache for bucket_name and model_path, creates it on first call
+        """
+        try:
+            key = (bucket_name,model_path)
+            with cls._instances_lock:
+                if key not in cls._instances:
+                    cls._instances[key] = cls(bucket_name=bucket_name,
+                                              model_path=model_path,
+                                              refresh_interval=refresh_interval)
+                return cls._instances[key]
+        except Exception as e:
+            raise VisaException(e,sys)
+
+    @property
+    def model_version(self):
+        return self._current[0]
+
+    def get_model(self)->USvisaModel:
+        """
+        returns loaded model, model is downloaded from s3 bucket only on first call
+        """
+        try:
+            model = self._current[1]
+            if model is None:
+                with self._load_lock:
+                    if self._current[1] is None:
+                        self._swap_model(*self._download_model())
+                        self._start_refresh_thread()
+                model = self._current[1]
+            return model
+        except Exception as e:
+            raise VisaException(e,sys)
+
+    def refresh(self)->bool:
+        """
+        checks version of model in s3 bucket and swaps the model if it has changed
+        returns True when a new model is loaded
+        """
+        try:
+            version = self.s3.get_object_version(filename=self.model_path,bucket_name=self.bucket_name)
+            if version == self.model_version:
+                return False
+
+            with self._load_lock:
+                model,version = self._download_model()
+                self._swap_model(model,version)
+            return True
+        except Exception as e:
+            raise VisaException(e,sys)
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _download_model(self):
+        logging.info(f"loading {self.model_path} model from {self.bucket_name} bucket")
+        return self.s3.load_model_with_version(model_name=self.model_path,bucket_name=self.bucket_name)
+
+    def _swap_model(self,model:USvisaModel,version):
+        previous_version = self.model_version
+        self._current = (version,model)
+        set_model_version(version)
+        logging.info(f"model version changed from {previous_version} to {version}")
+
+    def _start_refresh_thread(self):
+        if self.refresh_interval is None or self.refresh_interval <= 0 or self._refresh_thread is not None:
+            return
+        self._refresh_thread = threading.Thread(target=self._refresh_loop,
+                                                name="usvisa-model-refresh",
+                                                daemon=True)
+        self._refresh_thread.start()
+
+    def _refresh_loop(self):
+        while not self._stop_event.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                # keep serving the loaded model, next check will try again
+                logging.info(f"model refresh failed: {e}")
@@ -0,0 +1,184 @@
+import sys
+import time
+import importlib
+import multiprocessing
+
+import numpy as np
+from sklearn.neighbors import NearestNeighbors
+
+from us_visa.exception import VisaException
+from us_visa.logger import logging
+from us_visa.utils.main_utils import read_yaml_file
+
+
+def fit_resample_in_process(connection,sampler,features:np.ndarray,target:np.ndarray):
+    """
+    runs sampler in a worker process and sends resampled data back, module level so spawn can import it
+    """
+    connection.send(sampler.fit_resample(features,target))
+    connection.close()
+
+
+class Resampler:
+    """
+    This class balances classes of transformed data with a resampler chosen in config/resampling.yaml.
+    Neighbour searches run on n_jobs cores, large inputs can be subsampled before neighbour search
+    and a wall clock budget can be set, resampling then runs in a worker process which is stopped when
+    the budget is exceeded and the cheap fallback method is applied instead
+    """
+    def __init__(self,method:str,methods:dict,n_jobs:int=None,max_rows:int=None,time_budget_seconds:float=None,
+                 fallback_method:str='none',random_state:int=None):
+        """
+        :param method : name of entry of methods to apply
+        :param methods : name -> {'class','module','params'} of imblearn resamplers, None for no resampling
+        :param n_jobs : jobs of nearest neighbour searches
+        :param max_rows : rows entering resampling, None keeps all rows
+        :param time_budget_seconds : seconds allowed per resampling, None waits for completion
+        :param fallback_method : entry of methods applied when time budget is exceeded
+        :param random_state : seed of subsampling and resamplers
+        """
+        try:
+            for name in (method,fallback_method):
+                if name not in methods:
+                    raise ValueError(f"resampling method {name} not in {list(methods)}")
+            self.method = method
+            self.methods = methods
+            self.n_jobs = n_jobs
+            self.max_rows = max_rows
+            self.time_budget_seconds = time_budget_seconds
+            self.fallback_method = fallback_method
+            self.random_state = random_state
+        except Exception as e:
+            raise VisaException(e,sys)
+
+    @classmethod
+    def from_config_file(cls,filepath:str)->"Resampler":
+        try:
+            config = read_yaml_file(filepath=filepath)
+            return cls(method=config['method'],
+                       methods=config['methods'],
+                       n_jobs=config.get('n_jobs'),
+                       max_rows=config.get('max_rows'),
+                       time_budget_seconds=config.get('time_budget_seconds'),
+                       fallback_method=config.get('fallback_method','none'),
+                       random_state=config.get('random_state'))
+        except Exception as e:
+            raise VisaException(e,sys)
+
+    def get_sampler(self,method:str):
+        """
+        returns resampler object of method, None for no resampling
+        neighbour counts given as int are replaced by NearestNeighbors running on n_jobs cores
+        """
+        method_config = self.methods[method]
+        if method_config is None:
+            return None
+        sampler_class = getattr(importlib.import_module(method_config['module']),method_config['class'])
+        sampler = sampler_class(**(method_config.get('params') or {}))
+        if 'random_state' in sampler.get_params(deep=False):
+            sampler.set_params(random_state=self.random_state)
+        return self._with_parallel_neighbors(sampler)
+
+    def _with_parallel_neighbors(self,sampler):
+        if self.n_jobs is None:
+            return sampler
+        params = sampler.get_params(deep=False)
+        # smote and enn are built by SMOTEENN only when not passed, they are built here with the same defaults
+        if 'smote' in params and 'enn' in params:
+            from imblearn.over_sampling import SMOTE
+            from imblearn.under_sampling import EditedNearestNeighbours
+            smote = params['smote'] if params['smote'] is not None else \
+                SMOTE(sampling_strategy=params['sampling_strategy'],random_state=params['random_state'])
+            enn = params['enn'] if params['enn'] is not None else EditedNearestNeighbours(sampling_strategy='all')
+            return sampler.set_params(smote=self._with_parallel_neighbors(smote),enn=self._with_parallel_neighbors(enn))
+        if 'k_neighbors' in params:
+            # n_jobs of smote is deprecated, neighbour search is parallelised through its NearestNeighbors object,
+            # imblearn asks for one more neighbour than configured since every point is its own nearest neighbour
+            if isinstance(params['k_neighbors'],int):
+                sampler.set_params(k_neighbors=NearestNeighbors(n_neighbors=params['k_neighbors'] + 1,n_jobs=self.n_jobs))
+            elif isinstance(params['k_neighbors'],NearestNeighbors):
+                params['k_neighbors'].set_params(n_jobs=self.n_jobs)
+        elif 'n_jobs' in params:
+            # edited nearest neighbours and similar samplers pass their n_jobs on to neighbour search
+            sampler.set_params(n_jobs=self.n_jobs)
+        return sampler
+
+    def subsample(self,features:np.ndarray,target:np.ndarray):
+        """
+        returns at most max_rows rows, quota is shared evenly over classes so classes smaller than their
+        share are kept complete and larger classes are sampled down, row order is kept
+        """
+        if self.max_rows is None or len(target) <= self.max_rows:
+            return features,target
+        rng = np.random.default_rng(self.random_state)
+        classes,counts = np.unique(target,return_counts=True)
+        remaining = self.max_rows
+        indexes = []
+        for position,class_index in enumerate(np.argsort(counts)):
+            class_rows = np.flatnonzero(target == classes[class_index])
+            n_keep = min(len(class_rows),remaining//(len(classes) - position))
+            indexes.append(class_rows if n_keep == len(class_rows) else rng.choice(class_rows,size=n_keep,replace=False))
+            remaining -= n_keep
+        indexes = np.sort(np.concatenate(indexes))
+        return features[indexes],target[indexes]
+
+    def _run_with_budget(self,sampler,features:np.ndarray,target:np.ndarray):
+        """
+        returns resampled data, None when time budget is exceeded
+        """
+        if self.time_budget_seconds is None:
+            return sampler.fit_resample(features,target)
+        # a plain process rather than a pool: pool workers are daemonic and joblib runs neighbour search
+        # of daemonic processes on one core. spawn like training jobs, a forked child inherits parent threads
+        context = multiprocessing.get_context("spawn")
+        receiver,sender = context.Pipe(duplex=False)
+        process = context.Process(target=fit_resample_in_process,args=(sender,sampler,features,target),
+                                  name="usvisa-resampling")
+        process.start()
+        sender.close()
+        try:
+            if receiver.poll(self.time_budget_seconds):
+                return receiver.recv()
+            return None
+        except EOFError:
+            raise Exception(f"resampling process exited with code {process.exitcode} before sending result")
+        finally:
+            receiver.close()
+            if process.is_alive():
+                process.terminate()
+            process.join()
+
+    def fit_resample(self,features:np.ndarray,target:np.ndarray,name:str):
+        """
+        Method Name : fit_resample
+        Description : this method resamples features and target of dataset name with configured method
+        Output      : returns resampled features, resampled target and report with row counts and seconds
+        On failure  : write error log and raise exception
+        """
+        try:
+            target = np.asarray(target)
+            start_time = time.perf_counter()
+            report = {'method':self.method,'n_rows':int(len(target)),'timed_out':False}
+
+            sampled_features,sampled_target = self.subsample(features,target)
+            report['n_rows_sampled'] = int(len(sampled_target))
+            report['subsample_seconds'] = time.perf_counter() - start_time
+
+            sampler = self.get_sampler(self.method)
+            resampled = (sampled_features,sampled_target) if sampler is None else \
+                self._run_with_budget(sampler,sampled_features,sampled_target)
+            if resampled is None:
+                logging.info(f"{self.method} resampling of {name} dataset exceeded {self.time_budget_seconds}s, "
+                             f"applying {self.fallback_method} instead")
+                report.update(timed_out=True,method=self.fallback_method)
+                fallback_sampler = self.get_sampler(self.fallback_method)
+                resampled = (sampled_features,sampled_target) if fallback_sampler is None else \
+                    fallback_sampler.fit_resample(sampled_features,sampled_target)
+
+            resampled_features,resampled_target = resampled
+            report['n_rows_resampled'] = int(len(resampled_target))
+            report['seconds'] = time.perf_counter() - start_time
+            logging.info(f"resampled {name} dataset: {report}")
+            return resampled_features,np.asarray(resampled_target),report
+        except Exception as e:
+            raise VisaException(e,sys)
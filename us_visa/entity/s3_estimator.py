@@ -1,6 +1,7 @@
 from us_visa.cloud_storage.aws_storage import SimpleStorageService
 from us_visa.exception import VisaException
 from us_visa.entity.estimator import USvisaModel
+from us_visa.utils.metrics import time_stage
 import sys
 from pandas import DataFrame
 
@@ -30,7 +31,8 @@ class USvisaEstimator:
         """
         load the model from model path
         """
-        return self.s3.load_model(self.model_path,bucket_name=self.bucket_name)
+        with time_stage("model_acquisition"):
+            return self.s3.load_model(self.model_path,bucket_name=self.bucket_name)
 
     def save_model(self,from_file,remove=False):
         """
@@ -0,0 +1,134 @@
+import sys
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from us_visa.exception import VisaException
+
+# distinct offending values kept per column for the report
+MAX_EXAMPLES = 5
+
+
+class SchemaValidator:
+    """
+    This class is compiled once from schema.yaml and checks dataframes against it: presence of columns,
+    dtypes, missing values, allowed categories and numerical ranges. Every column is checked with vectorized
+    operations over the whole frame
+    """
+    def __init__(self,column_dtypes:dict,domains:dict,ranges:dict,nullable_columns:list,
+                 optional_columns:list,derived_column:str):
+        """
+        :param column_dtypes : column -> 'int' or 'category' for every expected column
+        :param domains : column -> list of allowed values of categorical columns
+        :param ranges : column -> {'min': lower bound, 'max': upper bound}, bounds are optional and inclusive
+        :param nullable_columns : columns which may hold missing values
+        :param optional_columns : columns which may be missing when derived_column is present
+        :param derived_column : column derived from optional_columns by mongodb export
+        """
+        self.column_dtypes = column_dtypes
+        self.domains = {column:pd.Index(values).astype(str) for column,values in domains.items()}
+        self.ranges = ranges
+        self.nullable_columns = set(nullable_columns)
+        self.optional_columns = set(optional_columns)
+        self.derived_column = derived_column
+
+    @classmethod
+    def from_schema(cls,schema_config:dict)->"SchemaValidator":
+        try:
+            column_dtypes = {column:dtype for column_dtype in schema_config['columns'] for column,dtype in column_dtype.items()}
+            # company_age is the only derived feature, it replaces the drop columns in exported data
+            derived_column = 'company_age'
+            column_dtypes.setdefault(derived_column,'int')
+            return cls(column_dtypes=column_dtypes,
+                       domains=schema_config.get('domains',{}),
+                       ranges=schema_config.get('ranges',{}),
+                       nullable_columns=schema_config.get('nullable_columns',[]),
+                       optional_columns=schema_config['drop_columns'],
+                       derived_column=derived_column)
+        except Exception as e:
+            raise VisaException(e,sys)
+
+    def _check_column(self,column:str,series:pd.Series)->dict:
+        expected_dtype = self.column_dtypes[column]
+        if expected_dtype == 'int':
+            dtype_ok = pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype)
+        else:
+            dtype_ok = isinstance(series.dtype,pd.CategoricalDtype) or pd.api.types.is_object_dtype(series.dtype) \
+                or pd.api.types.is_string_dtype(series.dtype)
+
+        is_null = series.isna().to_numpy()
+        null_violations = np.zeros(len(series),dtype=bool) if column in self.nullable_columns else is_null
+        out_of_domain = np.zeros(len(series),dtype=bool)
+        out_of_range = np.zeros(len(series),dtype=bool)
+
+        if column in self.domains:
+            if isinstance(series.dtype,pd.CategoricalDtype):
+                # categories are checked once, rows only through their integer codes
+                allowed = np.append(series.cat.categories.astype(str).isin(self.domains[column]),True)
+                out_of_domain = ~allowed[series.cat.codes.to_numpy()]
+            else:
+                out_of_domain = ~series.astype(str).isin(self.domains[column]).to_numpy() & ~is_null
+
+        if column in self.ranges:
+            values = series.to_numpy(dtype=np.float64,na_value=np.nan) if dtype_ok else \
+                pd.to_numeric(series,errors='coerce').to_numpy(dtype=np.float64,na_value=np.nan)
+            bounds = self.ranges[column]
+            with np.errstate(invalid='ignore'):
+                if bounds.get('min') is not None:
+                    out_of_range |= values < bounds['min']
+                if bounds.get('max') is not None:
+                    out_of_range |= values > bounds['max']
+            # values which are not numbers at all are out of range as well
+            out_of_range |= np.isnan(values) & ~is_null
+
+        violations = null_violations | out_of_domain | out_of_range
+        examples = series[out_of_domain | out_of_range].drop_duplicates().head(MAX_EXAMPLES).tolist() if violations.any() else []
+        return {'dtype':str(series.dtype),
+                'dtype_ok':bool(dtype_ok),
+                'n_null':int(is_null.sum()),
+                'n_out_of_domain':int(out_of_domain.sum()),
+                'n_out_of_range':int(out_of_range.sum()),
+                'n_violations':int(violations.sum()),
+                'examples':examples}
+
+    def check_columns(self,dataframe:DataFrame)->dict:
+        """
+        returns column -> violation counts of dataframe
+        """
+        return {column:self._check_column(column,dataframe[column]) for column in dataframe.columns if column in self.column_dtypes}
+
+    def summarize(self,columns:list,n_rows:int,column_summaries:dict,max_violation_share:float)->dict:
+        """
+        status is False when an expected column is missing, an unexpected column or a wrong dtype is present,
+        or when more than max_violation_share of the rows of a column violate the schema
+        """
+        derived = self.derived_column in columns
+        missing_columns = [column for column in self.column_dtypes
+                           if column not in columns and column != self.derived_column
+                           and not (derived and column in self.optional_columns)]
+        unexpected_columns = [column for column in columns if column not in self.column_dtypes]
+
+        failed_columns = []
+        for column,column_summary in column_summaries.items():
+            violation_share = column_summary['n_violations']/n_rows if n_rows > 0 else 0.0
+            column_summary['violation_share'] = violation_share
+            if not column_summary['dtype_ok'] or violation_share > max_violation_share:
+                failed_columns.append(column)
+
+        return {'n_rows':n_rows,
+                'status':len(missing_columns) == 0 and len(unexpected_columns) == 0 and len(failed_columns) == 0,
+                'missing_columns':missing_columns,
+                'unexpected_columns':unexpected_columns,
+                'failed_columns':failed_columns,
+                'columns':column_summaries}
+
+    def validate(self,dataframe:DataFrame,max_violation_share:float)->dict:
+        """
+        checks a whole dataframe in one pass, see summarize
+        validator holds no state, so one validator can check several frames from different threads
+        """
+        try:
+            return self.summarize(list(dataframe.columns),len(dataframe),self.check_columns(dataframe),max_violation_share)
+        except Exception as e:
+            raise VisaException(e,sys)
@@ -1,14 +1,7 @@
-from us_visa.constant import *
-import pymongo
-import pandas as pd
-from dotenv import load_dotenv
-load_dotenv()
+import os
+from us_visa.entity.config_entity import DataLoaderConfig
+from us_visa.data_access.usvisadata_loader import UsVisaDataLoader
 
 filepath = os.path.join(os.getcwd(),'us_visa','notebooks','EasyVisa.csv')
-df = pd.read_csv(filepath)
-data = df.to_dict(orient='records')
-
-client = pymongo.MongoClient(os.getenv('MONGODB_URL'))
-collection = client[DATABASE_NAME][COLLECTION_NAME]
-collection.insert_many(data)
-print("success")
\ No newline at end of file
+artifact = UsVisaDataLoader(DataLoaderConfig(input_file_path=filepath)).initiate_data_load()
+print(f"success: {artifact}")
@@ -0,0 +1,160 @@
+import os
+import sys
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pandas import DataFrame
+
+from us_visa.constant import TARGET_COLUMN
+from us_visa.entity.config_entity import BatchPredictionConfig
+from us_visa.entity.artifact_entity import BatchPredictionArtifact
+from us_visa.entity.estimator import TargetValueMapping
+from us_visa.entity.s3_estimator import USvisaEstimator
+from us_visa.exception import VisaException
+from us_visa.logger import logging
+from us_visa.utils.main_utils import load_object, add_company_age
+
+# model loaded once per worker process by _init_worker
+_worker_model = None
+
+
+def _init_worker(bucket_name,model_path,local_model_file_path):
+    global _worker_model
+    if local_model_file_path is not None:
+        _worker_model = load_object(local_model_file_path)
+    else:
+        _worker_model = USvisaEstimator(bucket_name=bucket_name,model_path=model_path).load_model()
+
+
+def _score_chunk(chunk:DataFrame,id_column:str)->DataFrame:
+    chunk = add_company_age(chunk)
+
+    predictions = _worker_model.predict(chunk)
+    label_mapping = TargetValueMapping().reverse_mapping()
+
+    output = DataFrame(index=chunk.index)
+    if id_column in chunk.columns:
+        output[id_column] = chunk[id_column]
+    output[TARGET_COLUMN] = pd.Series(predictions,index=chunk.index).astype(int).map(label_mapping)
+    return output
+
+
+class BatchPrediction:
+    """
+    This class scores a csv or parquet file of applications chunk by chunk on a process pool
+    and writes predictions to output file as chunks complete
+    """
+    def __init__(self,batch_prediction_config:BatchPredictionConfig):
+        """
+        :param batch_prediction_config: configuration for batch prediction
+        """
+        try:
+            self.batch_prediction_config = batch_prediction_config
+        except Exception as e:
+            raise VisaException(e,sys)
+
+    @staticmethod
+    def is_parquet(filepath:str)->bool:
+        return filepath.endswith('.parquet') or filepath.endswith('.pq')
+
+    def iter_chunks(self):
+        """
+        Method Name : iter_chunks
+        Description : this method reads input file in chunks of chunk_size rows
+        """
+        try:
+            input_file_path = self.batch_prediction_config.input_file_path
+            chunk_size = self.batch_prediction_config.chunk_size
+            if self.is_parquet(input_file_path):
+                parquet_file = pq.ParquetFile(input_file_path)
+                for batch in parquet_file.iter_batches(batch_size=chunk_size):
+                    yield batch.to_pandas()
+            else:
+                yield from pd.read_csv(input_file_path,chunksize=chunk_size,na_values='na')
+        except Exception as e:
+            raise VisaException(e,sys)
+
+    def initiate_batch_prediction(self)->BatchPredictionArtifact:
+        """
+        Method Name : initiate_batch_prediction
+        Description : this method scores input file and writes predictions to output file
+        Output      : returns batch prediction artifact with row count and throughput
+        On failure  : writes error log and raises exception
+        """
+        try:
+            config = self.batch_prediction_config
+            output_dir = os.path.dirname(config.output_file_path)
+            if output_dir != "":
+                os.makedirs(output_dir,exist_ok=True)
+            if os.path.exists(config.output_file_path):
+                os.remove(config.output_file_path)
+
+            # at most two chunks per worker are in flight, this bounds memory for any input size
+            max_pending = 2*config.n_workers
+            pending = deque()
+            parquet_writer = None
+            n_rows = 0
+            start_time = time.perf_counter()
+
+            def write_result(result:DataFrame):
+                nonlocal parquet_writer, n_rows
+                if self.is_parquet(config.output_file_path):
+                    table = pa.Table.from_pandas(result,preserve_index=False)
+                    if parquet_writer is None:
+                        parquet_writer = pq.ParquetWriter(config.output_file_path,table.schema)
+                    parquet_writer.write_table(table)
+                else:
+                    result.to_csv(config.output_file_path,mode='a',index=False,header=n_rows==0)
+                n_rows += len(result)
+
+            with ProcessPoolExecutor(max_workers=config.n_workers,
+                                     initializer=_init_worker,
+                                     initargs=(config.model_bucket_name,
+                                               config.model_file_path,
+                                               config.local_model_file_path)) as executor:
+                for chunk in self.iter_chunks():
+                    pending.append(executor.submit(_score_chunk,chunk,config.id_column))
+                    if len(pending) >= max_pending:
+                        write_result(pending.popleft().result())
+                while pending:
+                    write_result(pending.popleft().result())
+
+            if parquet_writer is not None:
+                parquet_writer.close()
+
+            elapsed_seconds = time.perf_counter() - start_time
+            batch_prediction_artifact = BatchPredictionArtifact(
+                output_file_path=config.output_file_path,
+                n_rows=n_rows,
+                elapsed_seconds=elapsed_seconds,
+                rows_per_second=n_rows/elapsed_seconds if elapsed_seconds > 0 else 0.0
+            )
+            logging.info(f"batch prediction artifact: {batch_prediction_artifact}")
+            return batch_prediction_artifact
+        except Exception as e:
+            raise VisaException(e,sys)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="score a csv or parquet file of usvisa applications")
+    parser.add_argument("input_file_path")
+    parser.add_argument("output_file_path")
+    parser.add_argument("--chunk-size",type=int,default=BatchPredictionConfig.chunk_size)
+    parser.add_argument("--workers",type=int,default=BatchPredictionConfig.n_workers)
+    parser.add_argument("--id-column",default=BatchPredictionConfig.id_column)
+    parser.add_argument("--model-file",default=None,help="local model.pkl, model is loaded from s3 bucket when not given")
+    args = parser.parse_args()
+
+    batch_prediction = BatchPrediction(BatchPredictionConfig(input_file_path=args.input_file_path,
+                                                             output_file_path=args.output_file_path,
+                                                             chunk_size=args.chunk_size,
+                                                             n_workers=args.workers,
+                                                             id_column=args.id_column,
+                                                             local_model_file_path=args.model_file))
+    artifact = batch_prediction.initiate_batch_prediction()
+    print(f"scored {artifact.n_rows} rows in {artifact.elapsed_seconds:.2f}s ({artifact.rows_per_second:.0f} rows/sec)")
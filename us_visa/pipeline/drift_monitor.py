@@ -0,0 +1,226 @@
+import time
+import threading
+from bisect import bisect_right
+
+import numpy as np
+
+from us_visa.constant import (DATA_VALIDATION_DRIFT_SHARE, DATA_VALIDATION_PSI_THRESHOLD,
+                              DATA_VALIDATION_P_VALUE_THRESHOLD, DATA_VALIDATION_STAT_TEST_MAX_ROWS)
+from us_visa.entity.drift_sketch import DriftSketch
+from us_visa.logger import logging
+
+
+class _MonitorState:
+    """
+    bins of the reference sketch laid out for fast per record lookup, replaced as a whole on model change or new window
+    """
+    __slots__ = ("generation","sketch","model_version","numerical","categorical")
+
+    def __init__(self,generation:int,sketch:DriftSketch,model_version):
+        self.generation = generation
+        self.sketch = sketch
+        self.model_version = model_version
+        self.numerical = [(column,list(sketch.numerical[column]['edges'])) for column in sketch.numerical]
+        self.categorical = [(column,{category:index for index,category in enumerate(sketch.categorical[column]['categories'])},
+                             len(sketch.categorical[column]['categories']))
+                            for column in sketch.categorical]
+
+
+class _Shard:
+    """
+    counts of one thread, only the owning thread writes to it so updates need no lock
+    """
+    __slots__ = ("generation","n_records","numerical_counts","categorical_counts")
+
+    def __init__(self,state:_MonitorState):
+        self.generation = state.generation
+        self.n_records = 0
+        self.numerical_counts = [[0]*(len(edges) + 1) for _,edges in state.numerical]
+        self.categorical_counts = [[0]*(n_categories + 1) for _,_,n_categories in state.categorical]
+
+
+class DriftMonitor:
+    """
+    This class counts live prediction inputs into the bins of the reference sketch of the serving model
+    and periodically compares the counts against the sketch. Every thread counts into its own shard,
+    the lock is taken only when a shard is created or the window is reset
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self,check_interval:float,min_records:int,window_records:int,
+                 drift_share:float = DATA_VALIDATION_DRIFT_SHARE,
+                 psi_threshold:float = DATA_VALIDATION_PSI_THRESHOLD,
+                 p_value_threshold:float = DATA_VALIDATION_P_VALUE_THRESHOLD,
+                 stat_test_max_rows:int = DATA_VALIDATION_STAT_TEST_MAX_ROWS):
+        """
+        :param check_interval : seconds between drift checks of the background thread
+        :param min_records : records needed in the window before drift is computed
+        :param window_records : window is started again after a check once it holds this many records
+        """
+        self.check_interval = check_interval
+        self.min_records = min_records
+        self.window_records = window_records
+        self.drift_share = drift_share
+        self.psi_threshold = psi_threshold
+        self.p_value_threshold = p_value_threshold
+        self.stat_test_max_rows = stat_test_max_rows
+
+        self._state = None
+        self._shards = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._latest_report = None
+        self._generation = 0
+        self._stop_event = threading.Event()
+        self._check_thread = None
+
+    @classmethod
+    def get_instance(cls,check_interval:float,min_records:int,window_records:int)->"DriftMonitor":
+        """
+        returns monitor shared by the process, creates it on first call
+        """
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls(check_interval=check_interval,min_records=min_records,window_records=window_records)
+            return cls._instance
+
+    @property
+    def model_version(self):
+        state = self._state
+        return state.model_version if state is not None else None
+
+    def set_reference(self,sketch:DriftSketch,model_version):
+        """
+        switches monitor to sketch of model_version, counts of the previous model are dropped
+        """
+        state = self._state
+        if state is not None and state.model_version == model_version:
+            return
+        with self._lock:
+            if self._state is not None and self._state.model_version == model_version:
+                return
+            self._generation += 1
+            self._state = _MonitorState(self._generation,sketch,model_version) if sketch is not None else None
+            self._shards = []
+            self._latest_report = None
+        logging.info(f"drift monitor reference set to model version {model_version}, sketch present {sketch is not None}")
+        if sketch is not None:
+            self._start_check_thread()
+
+    def observe(self,record:dict):
+        """
+        counts one input record, values which are missing or not numbers are skipped
+        """
+        state = self._state
+        if state is None:
+            return
+        shard = getattr(self._local,'shard',None)
+        if shard is None or shard.generation != state.generation:
+            shard = self._new_shard(state)
+
+        for (column,edges),counts in zip(state.numerical,shard.numerical_counts):
+            try:
+                value = float(record.get(column))
+            except (TypeError,ValueError):
+                continue
+            if value == value:
+                counts[bisect_right(edges,value)] += 1
+        for (column,lookup,n_categories),counts in zip(state.categorical,shard.categorical_counts):
+            value = record.get(column)
+            if value is not None:
+                counts[lookup.get(str(value).strip(),n_categories)] += 1
+        shard.n_records += 1
+
+    def _new_shard(self,state:_MonitorState)->_Shard:
+        shard = _Shard(state)
+        with self._lock:
+            if self._state is state:
+                self._shards.append(shard)
+        self._local.shard = shard
+        return shard
+
+    def get_current_counts(self):
+        """
+        returns (state, counts per column summed over shards, number of records) of the current window
+        """
+        state = self._state
+        if state is None:
+            return None,{},0
+        shards = [shard for shard in list(self._shards) if shard.generation == state.generation]
+        counts = {}
+        for index,(column,edges) in enumerate(state.numerical):
+            counts[column] = np.sum([shard.numerical_counts[index] for shard in shards],axis=0) if shards else np.zeros(len(edges) + 1)
+        for index,(column,_,n_categories) in enumerate(state.categorical):
+            counts[column] = np.sum([shard.categorical_counts[index] for shard in shards],axis=0) if shards else np.zeros(n_categories + 1)
+        return state,counts,sum(shard.n_records for shard in shards)
+
+    def evaluate(self):
+        """
+        compares current window against reference sketch when it holds at least min_records records
+        returns latest drift report, None when there was never enough traffic
+        """
+        state,counts,n_records = self.get_current_counts()
+        if state is None or n_records < self.min_records:
+            return self._latest_report
+
+        # columns never sent by clients, e.g. the target, are left out of the comparison
+        counts = {column:column_counts for column,column_counts in counts.items() if np.sum(column_counts) > 0}
+        report = state.sketch.compare_counts(counts,drift_share=self.drift_share,psi_threshold=self.psi_threshold,
+                                             p_value_threshold=self.p_value_threshold,stat_test_max_rows=self.stat_test_max_rows)
+        report['model_version'] = state.model_version
+        report['n_records'] = n_records
+        report['evaluated_at'] = time.time()
+        self._latest_report = report
+
+        if n_records >= self.window_records:
+            with self._lock:
+                if self._state is state:
+                    self._generation += 1
+                    self._state = _MonitorState(self._generation,state.sketch,state.model_version)
+                    self._shards = []
+        return report
+
+    def get_report(self)->dict:
+        """
+        returns drift report of current window, or of the last full window when the current one is too small
+        """
+        report = self.evaluate()
+        _,_,n_records = self.get_current_counts()
+        return {'model_version':self.model_version,
+                'window_records':n_records,
+                'min_records':self.min_records,
+                'report':report}
+
+    def get_metrics(self)->dict:
+        _,_,n_records = self.get_current_counts()
+        metrics = {'window_records':n_records}
+        report = self._latest_report
+        if report is not None:
+            drift_metrics = report['data_drift']['data']['metrics']
+            metrics.update(features=drift_metrics['n_features'],
+                           drifted_features=drift_metrics['n_drifted_features'],
+                           share_drifted_features=drift_metrics['share_drifted_features'],
+                           dataset_drift=int(drift_metrics['dataset_drift']))
+            for column,column_metrics in drift_metrics['columns'].items():
+                metrics[f"score_{column}"] = column_metrics['drift_score']
+        return metrics
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _start_check_thread(self):
+        with self._lock:
+            if self.check_interval is None or self.check_interval <= 0 or self._check_thread is not None:
+                return
+            self._check_thread = threading.Thread(target=self._check_loop,name="usvisa-drift-monitor",daemon=True)
+            self._check_thread.start()
+
+    def _check_loop(self):
+        while not self._stop_event.wait(self.check_interval):
+            try:
+                report = self.evaluate()
+                if report is not None and report['data_drift']['data']['metrics']['dataset_drift']:
+                    logging.info(f"drift detected on live traffic of model version {report['model_version']}")
+            except Exception as e:
+                logging.info(f"drift check failed: {e}")
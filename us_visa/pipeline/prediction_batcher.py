@@ -0,0 +1,138 @@
+import sys
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from us_visa.exception import VisaException
+from us_visa.logger import logging
+from us_visa.utils.metrics import PREDICTION_BATCH_REQUESTS, PREDICTION_BATCH_RECORDS
+
+
+class PredictionBatcher:
+    """
+    This class coalesces concurrent prediction requests. Requests are collected for up to
+    max_wait_ms milliseconds or max_batch_records records, scored with one model.predict call
+    and the results are handed back to the waiting callers
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self,model_getter,max_wait_ms:float,max_batch_records:int):
+        """
+        :param model_getter : callable returning the USvisaModel to score a batch with
+        :param max_wait_ms : longest time the first request of a batch waits for more requests
+        :param max_batch_records : batch is scored as soon as it holds this many records
+        """
+        self.model_getter = model_getter
+        self.max_wait_ms = max_wait_ms
+        self.max_batch_records = max_batch_records
+
+        self._queue = queue.Queue()
+        self._metrics_lock = threading.Lock()
+        self._n_batches = 0
+        self._n_requests = 0
+        self._n_records = 0
+        self._queue_delay_sum = 0.0
+        self._queue_delay_max = 0.0
+
+        self._worker = threading.Thread(target=self._run,name="usvisa-prediction-batcher",daemon=True)
+        self._worker.start()
+
+    @classmethod
+    def get_instance(cls,model_getter,max_wait_ms:float,max_batch_records:int)->"PredictionBatcher":
+        """
+        returns batcher shared by the process, creates it on first call
+        """
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls(model_getter=model_getter,
+                                    max_wait_ms=max_wait_ms,
+                                    max_batch_records=max_batch_records)
+            return cls._instance
+
+    def submit(self,dataframe:DataFrame)->Future:
+        """
+        queues dataframe for prediction, returned future resolves to array of predictions
+        """
+        future = Future()
+        self._queue.put((time.perf_counter(),dataframe,future))
+        return future
+
+    def predict(self,dataframe:DataFrame)->np.ndarray:
+        try:
+            return self.submit(dataframe).result()
+        except Exception as e:
+            raise VisaException(e,sys)
+
+    def get_metrics(self)->dict:
+        """
+        returns counters and queueing delay in seconds, batch sizes are in PREDICTION_BATCH_REQUESTS and PREDICTION_BATCH_RECORDS
+        """
+        with self._metrics_lock:
+            return {
+                "batches":self._n_batches,
+                "requests":self._n_requests,
+                "records":self._n_records,
+                "queue_delay_seconds_sum":self._queue_delay_sum,
+                "queue_delay_seconds_max":self._queue_delay_max
+            }
+
+    def _collect_batch(self)->list:
+        first = self._queue.get()
+        batch = [first]
+        n_records = len(first[1])
+        deadline = first[0] + self.max_wait_ms/1000
+        while n_records < self.max_batch_records:
+            timeout = deadline - time.perf_counter()
+            try:
+                # once the window is over only requests which are already queued join the batch
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+            n_records += len(item[1])
+        return batch
+
+    def _record_metrics(self,batch:list,n_records:int,started_at:float):
+        queue_delays = [started_at - enqueued_at for enqueued_at,_,_ in batch]
+        with self._metrics_lock:
+            self._n_batches += 1
+            self._n_requests += len(batch)
+            self._n_records += n_records
+            self._queue_delay_sum += sum(queue_delays)
+            self._queue_delay_max = max(self._queue_delay_max,max(queue_delays))
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            started_at = time.perf_counter()
+            frames = [dataframe for _,dataframe,_ in batch]
+            n_records = sum(len(dataframe) for dataframe in frames)
+            self._record_metrics(batch,n_records,started_at)
+            PREDICTION_BATCH_REQUESTS.observe(len(batch))
+            PREDICTION_BATCH_RECORDS.observe(n_records)
+            try:
+                predictions = self.model_getter().predict(pd.concat(frames,ignore_index=True))
+            except Exception as e:
+                logging.info(f"batched prediction of {n_records} records failed, scoring {len(batch)} requests separately: {e}")
+                self._predict_separately(batch)
+                continue
+            offset = 0
+            for _,dataframe,future in batch:
+                future.set_result(predictions[offset:offset + len(dataframe)])
+                offset += len(dataframe)
+
+    def _predict_separately(self,batch:list):
+        """
+        scores every request of a failed batch on its own, so a bad request fails only its own caller
+        """
+        for _,dataframe,future in batch:
+            try:
+                future.set_result(self.model_getter().predict(dataframe))
+            except Exception as e:
+                future.set_exception(e)
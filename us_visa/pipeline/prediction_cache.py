@@ -0,0 +1,84 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """
+    This class is a bounded LRU cache of predictions with time to live. Every entry belongs
+    to the model version it was predicted with and the whole cache is dropped when version changes
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self,max_size:int,ttl_seconds:float):
+        """
+        :param max_size : maximum number of cached predictions, least recently used one is evicted first
+        :param ttl_seconds : seconds after which a cached prediction expires
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.model_version = None
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+    @classmethod
+    def get_instance(cls,max_size:int,ttl_seconds:float)->"PredictionCache":
+        """
+        returns cache shared by the process, creates it on first call
+        """
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls(max_size=max_size,ttl_seconds=ttl_seconds)
+            return cls._instance
+
+    def _check_model_version(self,model_version):
+        # called with lock held
+        if model_version != self.model_version:
+            if len(self._entries) > 0:
+                self._invalidations += 1
+            self._entries.clear()
+            self.model_version = model_version
+
+    def get(self,key:tuple,model_version):
+        """
+        returns (True, prediction) for a fresh entry of model_version, otherwise (False, None)
+        """
+        with self._lock:
+            self._check_model_version(model_version)
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at,prediction = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return True,prediction
+                del self._entries[key]
+            self._misses += 1
+            return False,None
+
+    def put(self,key:tuple,prediction,model_version):
+        with self._lock:
+            self._check_model_version(model_version)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds,prediction)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_metrics(self)->dict:
+        with self._lock:
+            return {
+                "hits":self._hits,
+                "misses":self._misses,
+                "size":len(self._entries),
+                "invalidations":self._invalidations,
+                "model_version":self.model_version
+            }
@@ -1,14 +1,35 @@
 import sys
+import math
 
 import numpy as np
 import pandas as pd
+from us_visa.constant import PREDICTION_WARM_UP_RECORDS, SCHEMA_FILE_PATH
 from us_visa.entity.config_entity import USvisaPredictorConfig
-from us_visa.entity.s3_estimator import USvisaEstimator
+from us_visa.entity.estimator import TargetValueMapping
+from us_visa.entity.model_cache import USvisaModelCache
+from us_visa.pipeline.drift_monitor import DriftMonitor
+from us_visa.pipeline.prediction_batcher import PredictionBatcher
+from us_visa.pipeline.prediction_cache import PredictionCache
 from us_visa.exception import VisaException
 from us_visa.logger import logging
+from us_visa.utils.metrics import time_stage
+from us_visa.utils.main_utils import read_yaml_file
 from pandas import DataFrame
 
 class USvisaData:
+    categorical_fields = ["continent",
+                          "education_of_employee",
+                          "has_job_experience",
+                          "requires_job_training",
+                          "region_of_employment",
+                          "unit_of_wage",
+                          "full_time_position"]
+    numerical_fields = ["no_of_employees",
+                        "prevailing_wage",
+                        "company_age"]
+    # allowed values of categorical fields, read from schema on first use
+    _domains = None
+
     def __init__(self,
                  continent,
                  education_of_employee,
@@ -39,31 +60,91 @@ class USvisaData:
         except Exception as e:
             raise VisaException(e,sys)
     
+    @classmethod
+    def from_dict(cls,record:dict)->"USvisaData":
+        """
+        this function creates USvisaData from a json record or form, categorical values are stored stripped
+        and numerical values as floats, so "10" and 10 or " Asia " and "Asia" give the same features
+        raises ValueError when a field is missing, a categorical value is not in schema domains
+        or a numerical field is not a finite number
+        """
+        if not isinstance(record,dict):
+            raise ValueError("record must be a json object")
+
+        missing_fields = [field for field in cls.categorical_fields + cls.numerical_fields
+                          if record.get(field) in (None,"")]
+        if len(missing_fields) > 0:
+            raise ValueError(f"missing fields {missing_fields}")
+
+        domains = cls.get_domains()
+        values = {}
+        for field in cls.categorical_fields:
+            # stored stripped, so validation, cache key, drift monitor and model see the same value
+            value = str(record[field]).strip()
+            if field in domains and value not in domains[field]:
+                raise ValueError(f"{field} must be one of {sorted(domains[field])}, got {record[field]!r}")
+            values[field] = value
+        for field in cls.numerical_fields:
+            try:
+                value = float(record[field])
+            except (TypeError,ValueError):
+                raise ValueError(f"{field} must be a number, got {record[field]!r}")
+            # inf and nan parse as floats but fail the model call of every record scored with them
+            if not math.isfinite(value):
+                raise ValueError(f"{field} must be a finite number, got {record[field]!r}")
+            values[field] = value
+        return cls(**values)
+
+    @classmethod
+    def get_domains(cls)->dict:
+        """
+        returns field -> set of allowed values of categorical fields from schema domains
+        """
+        if cls._domains is None:
+            schema_config = read_yaml_file(filepath=SCHEMA_FILE_PATH)
+            cls._domains = {field:{str(value) for value in values}
+                            for field,values in schema_config.get('domains',{}).items() if field in cls.categorical_fields}
+        return cls._domains
+
     def get_usvisa_data_input_dataframe(self)->DataFrame:
         """
         this function returns a DataFrame of USvisadata class input
         """
         try:
-            usvisa_data_dict = self.get_usvisa_data_as_dict()
-            return DataFrame(usvisa_data_dict)
+            with time_stage("dataframe"):
+                usvisa_data_dict = self.get_usvisa_data_as_dict()
+                return DataFrame(usvisa_data_dict)
         except Exception as e:
             raise VisaException(e,sys)
 
     
+    def get_usvisa_data_as_record(self)->dict:
+        """
+        this function returns features as a flat dict, in the column order used for training
+        """
+        return {
+            "continent":self.continent,
+            "education_of_employee":self.education_of_employee,
+            "has_job_experience":self.has_job_experience,
+            "requires_job_training":self.requires_job_training,
+            "no_of_employees":self.no_of_employees,
+            "region_of_employment":self.region_of_employment,
+            "prevailing_wage":self.prevailing_wage,
+            "unit_of_wage":self.unit_of_wage,
+            "full_time_position":self.full_time_position,
+            "company_age":self.company_age
+        }
+
+    def get_cache_key(self)->tuple:
+        """
+        this function returns tuple of all features to look up cached predictions, values are normalised
+        by from_dict so the key is built from the same record the model and drift monitor get
+        """
+        return tuple(self.get_usvisa_data_as_record().values())
+
     def get_usvisa_data_as_dict(self):
         try:
-            input_data = {
-                "continent":[self.continent],
-                "education_of_employee":[self.education_of_employee],
-                "has_job_experience":[self.has_job_experience],
-                "requires_job_training":[self.requires_job_training],
-                "no_of_employees":[self.no_of_employees],
-                "region_of_employment":[self.region_of_employment],
-                "prevailing_wage":[self.prevailing_wage],
-                "unit_of_wage":[self.unit_of_wage],
-                "full_time_position":[self.full_time_position],
-                "company_age":[self.company_age]
-            }
+            input_data = {field:[value] for field,value in self.get_usvisa_data_as_record().items()}
 
             logging.info("created usvisa data dict")
             return input_data
@@ -77,14 +158,187 @@ class USvisaClassifier:
         except Exception as e:
             raise VisaException(e,sys)
         
+    def get_model_cache(self)->USvisaModelCache:
+        """
+        returns process wide model cache for configured bucket and model path
+        """
+        try:
+            return USvisaModelCache.get_instance(bucket_name=self.prediction_pipeline_config.model_bucket_name,
+                                                 model_path=self.prediction_pipeline_config.model_file_path,
+                                                 refresh_interval=self.prediction_pipeline_config.model_refresh_interval)
+        except Exception as e:
+            raise VisaException(e,sys)
+
+    def get_model(self):
+        """
+        returns loaded production model, s3 bucket is hit only when cache is empty
+        """
+        try:
+            with time_stage("model_acquisition"):
+                return self.get_model_cache().get_model()
+        except Exception as e:
+            raise VisaException(e,sys)
+
+    def get_model_version(self):
+        """
+        returns version of the loaded production model, loads the model when cache is empty
+        """
+        try:
+            model_cache = self.get_model_cache()
+            model_cache.get_model()
+            return model_cache.model_version
+        except Exception as e:
+            raise VisaException(e,sys)
+
+    def get_prediction_cache(self)->PredictionCache:
+        """
+        returns process wide prediction cache, None when it is disabled
+        """
+        try:
+            if not self.prediction_pipeline_config.prediction_cache_enabled:
+                return None
+            return PredictionCache.get_instance(max_size=self.prediction_pipeline_config.prediction_cache_max_size,
+                                                ttl_seconds=self.prediction_pipeline_config.prediction_cache_ttl_seconds)
+        except Exception as e:
+            raise VisaException(e,sys)
+
+    def get_drift_monitor(self)->DriftMonitor:
+        """
+        returns process wide drift monitor set to reference sketch of the loaded model, None when it is disabled
+        """
+        try:
+            if not self.prediction_pipeline_config.drift_monitor_enabled:
+                return None
+            drift_monitor = DriftMonitor.get_instance(check_interval=self.prediction_pipeline_config.drift_check_interval,
+                                                      min_records=self.prediction_pipeline_config.drift_min_records,
+                                                      window_records=self.prediction_pipeline_config.drift_window_records)
+            model_cache = self.get_model_cache()
+            model = model_cache.get_model()
+            drift_monitor.set_reference(model.get_reference_sketch(),model_cache.model_version)
+            return drift_monitor
+        except Exception as e:
+            raise VisaException(e,sys)
+
+    def is_model_loaded(self)->bool:
+        """
+        returns True when production model is resident in the process
+        """
+        return self.get_model_cache().model_version is not None
+
+    def warm_up(self):
+        """
+        loads production model and runs synthetic records through batch and single record paths,
+        so the first real request does not pay for download and first call initialisation
+        """
+        try:
+            model = self.get_model()
+            model.predict(DataFrame(PREDICTION_WARM_UP_RECORDS))
+            model.predict_record(PREDICTION_WARM_UP_RECORDS[0])
+            logging.info(f"warmed up model version {self.get_model_cache().model_version}")
+        except Exception as e:
+            raise VisaException(e,sys)
+
+    def get_batcher(self)->PredictionBatcher:
+        """
+        returns process wide batcher which coalesces concurrent predictions into one model call
+        """
+        try:
+            return PredictionBatcher.get_instance(model_getter=self.get_model,
+                                                  max_wait_ms=self.prediction_pipeline_config.batching_max_wait_ms,
+                                                  max_batch_records=self.prediction_pipeline_config.batching_max_records)
+        except Exception as e:
+            raise VisaException(e,sys)
+
     def predict(self,dataframe:DataFrame):
         """
         returns prediction in string format
         """
         try:
-            model = USvisaEstimator(bucket_name=self.prediction_pipeline_config.model_bucket_name,
-                                    model_path=self.prediction_pipeline_config.model_file_path)
+            if self.prediction_pipeline_config.batching_enabled:
+                return self.get_batcher().predict(dataframe)
+
+            model = self.get_model()
             result = model.predict(dataframe)
             return result
         except Exception as e:
             raise VisaException(e,sys)
+
+    def predict_record(self,usvisa_data:USvisaData):
+        """
+        returns prediction for single usvisa data, uses compiled preprocessor of the model when available
+        """
+        try:
+            drift_monitor = self.get_drift_monitor()
+            if drift_monitor is not None:
+                drift_monitor.observe(usvisa_data.get_usvisa_data_as_record())
+
+            prediction_cache = self.get_prediction_cache()
+            cache_key = usvisa_data.get_cache_key() if prediction_cache is not None else None
+            if cache_key is not None:
+                model_version = self.get_model_version()
+                found,prediction = prediction_cache.get(cache_key,model_version)
+                if found:
+                    return prediction
+
+            if self.prediction_pipeline_config.batching_enabled:
+                prediction = self.predict(usvisa_data.get_usvisa_data_input_dataframe())[0]
+            else:
+                model = self.get_model()
+                prediction = model.predict_record(usvisa_data.get_usvisa_data_as_record())
+
+            # a model swapped during prediction must not fill the cache of the new version
+            if cache_key is not None and self.get_model_cache().model_version == model_version:
+                prediction_cache.put(cache_key,prediction,model_version)
+            return prediction
+        except Exception as e:
+            raise VisaException(e,sys)
+
+    def predict_batch(self,records:list)->list:
+        """
+        scores list of json records with a single model call
+        returns one result per record in input order, either predicted case_status or error message
+        """
+        try:
+            results = [None]*len(records)
+            label_mapping = TargetValueMapping().reverse_mapping()
+            prediction_cache = self.get_prediction_cache()
+            model_version = self.get_model_version() if prediction_cache is not None else None
+            drift_monitor = self.get_drift_monitor()
+
+            valid_indexes = []
+            valid_rows = []
+            valid_cache_keys = []
+            for index,record in enumerate(records):
+                try:
+                    usvisa_data = USvisaData.from_dict(record)
+                except ValueError as e:
+                    results[index] = {"index":index,"error":str(e)}
+                    continue
+                if drift_monitor is not None:
+                    drift_monitor.observe(usvisa_data.get_usvisa_data_as_record())
+
+                cache_key = usvisa_data.get_cache_key() if prediction_cache is not None else None
+                if cache_key is not None:
+                    found,prediction = prediction_cache.get(cache_key,model_version)
+                    if found:
+                        results[index] = {"index":index,"case_status":label_mapping[int(prediction)]}
+                        continue
+
+                valid_rows.append(usvisa_data.get_usvisa_data_as_record())
+                valid_indexes.append(index)
+                valid_cache_keys.append(cache_key)
+
+            logging.info(f"batch of {len(records)} records has {len(valid_rows)} records to predict")
+
+            if len(valid_rows) > 0:
+                with time_stage("dataframe"):
+                    dataframe = DataFrame(valid_rows)
+                predictions = self.predict(dataframe)
+                fill_cache = prediction_cache is not None and self.get_model_cache().model_version == model_version
+                for index,cache_key,prediction in zip(valid_indexes,valid_cache_keys,predictions):
+                    results[index] = {"index":index,"case_status":label_mapping[int(prediction)]}
+                    if fill_cache and cache_key is not None:
+                        prediction_cache.put(cache_key,prediction,model_version)
+            return results
+        except Exception as e:
+            raise VisaException(e,sys)
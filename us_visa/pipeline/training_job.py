@@ -0,0 +1,220 @@
+import os
+import re
+import sys
+import json
+import uuid
+import multiprocessing
+from datetime import datetime
+from dataclasses import fields, is_dataclass
+
+from us_visa.entity.config_entity import TrainingJobConfig
+from us_visa.exception import VisaException
+from us_visa.logger import logging
+
+
+def artifact_to_dict(artifact):
+    """
+    converts artifact dataclass into json friendly dict, fields hidden from repr are skipped
+    """
+    if is_dataclass(artifact):
+        return {field.name:artifact_to_dict(getattr(artifact,field.name)) for field in fields(artifact) if field.repr}
+    if isinstance(artifact,(str,int,float,bool)) or artifact is None:
+        return artifact
+    if hasattr(artifact,'item'):
+        return artifact.item()
+    return str(artifact)
+
+
+class TrainingJobStatus:
+    """
+    This class keeps status of one training job in a json file, so it can be read from any process
+    """
+    def __init__(self,job_id:str,training_job_config:TrainingJobConfig):
+        self.job_id = job_id
+        self.status_file_path = os.path.join(training_job_config.training_job_dir,f"{job_id}.json")
+
+    def read(self):
+        if not os.path.exists(self.status_file_path):
+            return None
+        with open(self.status_file_path,'r') as file_obj:
+            return json.load(file_obj)
+
+    def write(self,status:dict):
+        os.makedirs(os.path.dirname(self.status_file_path),exist_ok=True)
+        tmp_file_path = f"{self.status_file_path}.tmp"
+        with open(tmp_file_path,'w') as file_obj:
+            json.dump(status,file_obj,indent=2)
+        os.replace(tmp_file_path,self.status_file_path)
+
+
+def run_training_job(job_id:str,training_job_config:TrainingJobConfig):
+    """
+    entry point of the training worker process, runs the pipeline and records progress of every stage
+    """
+    from us_visa.pipeline.training_pipeline import TrainingPipeline
+
+    job_status = TrainingJobStatus(job_id,training_job_config)
+    status = job_status.read()
+    status.update(state="running",pid=os.getpid(),started_at=datetime.now().isoformat())
+    job_status.write(status)
+
+    def stage_callback(stage_name,state,artifact):
+        stage = status["stages"][stage_name]
+        stage["state"] = state
+        if state == "running":
+            stage["started_at"] = datetime.now().isoformat()
+            status["current_stage"] = stage_name
+        else:
+            stage["finished_at"] = datetime.now().isoformat()
+            stage["artifact"] = artifact_to_dict(artifact)
+        job_status.write(status)
+
+    try:
+        training_pipeline = TrainingPipeline(stage_callback=stage_callback)
+        model_pusher_artifact = training_pipeline.run_pipeline()
+        status.update(state="succeeded",model_pushed=model_pusher_artifact is not None)
+    except Exception as e:
+        logging.info(f"training job {job_id} failed: {e}")
+        current_stage = status.get("current_stage")
+        if current_stage is not None:
+            status["stages"][current_stage]["state"] = "failed"
+        status.update(state="failed",error=str(e))
+    finally:
+        status["finished_at"] = datetime.now().isoformat()
+        job_status.write(status)
+        TrainingJobManager(training_job_config).release_lock(job_id)
+
+
+class TrainingJobManager:
+    """
+    This class starts training pipeline in a separate worker process and allows only one
+    running training job at a time
+    """
+    def __init__(self,training_job_config:TrainingJobConfig=TrainingJobConfig()):
+        """
+        :param training_job_config: configuration for training jobs
+        """
+        self.training_job_config = training_job_config
+
+    def _read_lock(self):
+        try:
+            with open(self.training_job_config.lock_file_path,'r') as file_obj:
+                return json.load(file_obj)
+        except (FileNotFoundError,ValueError):
+            return None
+
+    def _acquire_lock(self,job_id:str)->bool:
+        """
+        creates lock file holding pid of the submitting process, so the lock is alive before job status exists
+        """
+        os.makedirs(self.training_job_config.training_job_dir,exist_ok=True)
+        try:
+            file_descriptor = os.open(self.training_job_config.lock_file_path,os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(file_descriptor,'w') as file_obj:
+            json.dump({"job_id":job_id,"pid":os.getpid(),"created_at":datetime.now().isoformat()},file_obj)
+        return True
+
+    def _write_lock(self,lock:dict):
+        tmp_file_path = f"{self.training_job_config.lock_file_path}.tmp"
+        with open(tmp_file_path,'w') as file_obj:
+            json.dump(lock,file_obj)
+        os.replace(tmp_file_path,self.training_job_config.lock_file_path)
+
+    def release_lock(self,job_id:str):
+        lock = self._read_lock()
+        if lock is not None and lock.get("job_id") == job_id:
+            os.remove(self.training_job_config.lock_file_path)
+
+    def _is_job_alive(self,lock:dict)->bool:
+        status = self.get_status(lock["job_id"])
+        if status is not None and status["state"] in ("succeeded","failed"):
+            return False
+        # lock holds pid of the submitting process until the worker is started, then pid of the worker
+        pid = (status or {}).get("pid") or lock.get("pid")
+        if pid is None:
+            return status is not None
+        try:
+            os.kill(pid,0)
+            return True
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+
+    def get_active_job_id(self):
+        """
+        returns id of running training job or None
+        """
+        try:
+            # reap finished workers started from this process
+            multiprocessing.active_children()
+            lock = self._read_lock()
+            if lock is None:
+                return None
+            if self._is_job_alive(lock):
+                return lock["job_id"]
+
+            logging.info(f"removing stale training job lock of {lock['job_id']}")
+            self.release_lock(lock["job_id"])
+            return None
+        except Exception as e:
+            raise VisaException(e,sys)
+
+    def submit(self):
+        """
+        starts a new training job unless one is already running
+        returns (job_id, True) for a new job and (job_id, False) for the job which is already running
+        """
+        try:
+            job_id = uuid.uuid4().hex
+            while not self._acquire_lock(job_id):
+                active_job_id = self.get_active_job_id()
+                if active_job_id is not None:
+                    logging.info(f"training job {active_job_id} is already running")
+                    return active_job_id,False
+
+            try:
+                TrainingJobStatus(job_id,self.training_job_config).write({
+                    "job_id":job_id,
+                    "state":"queued",
+                    "created_at":datetime.now().isoformat(),
+                    "current_stage":None,
+                    "stages":{stage_name:{"state":"pending"} for stage_name in self.stage_names()}
+                })
+
+                # spawn gives the job a fresh interpreter, so artifact timestamp is taken when job starts
+                context = multiprocessing.get_context("spawn")
+                process = context.Process(target=run_training_job,
+                                          args=(job_id,self.training_job_config),
+                                          name=f"usvisa-training-{job_id}")
+                process.start()
+            except Exception:
+                # the submitting process stays alive, its lock would never turn stale
+                self.release_lock(job_id)
+                raise
+            lock = self._read_lock()
+            # a worker which already finished has released the lock
+            if lock is not None and lock.get("job_id") == job_id:
+                self._write_lock(dict(lock,pid=process.pid))
+            logging.info(f"started training job {job_id} in process {process.pid}")
+            return job_id,True
+        except Exception as e:
+            raise VisaException(e,sys)
+
+    def get_status(self,job_id:str):
+        """
+        returns status dict of job_id or None for unknown job
+        """
+        try:
+            if re.fullmatch(r"[0-9a-f]{32}",job_id) is None:
+                return None
+            return TrainingJobStatus(job_id,self.training_job_config).read()
+        except Exception as e:
+            raise VisaException(e,sys)
+
+    @staticmethod
+    def stage_names()->list:
+        from us_visa.pipeline.training_pipeline import TrainingPipeline
+        return TrainingPipeline.stage_names
@@ -1,4 +1,5 @@
 import sys
+import argparse
 
 from us_visa.exception import VisaException
 from us_visa.logger import logging
@@ -26,8 +27,20 @@ from us_visa.entity.artifact_entity import (DataIngestionArtifact,
 
 
 class TrainingPipeline:
-    def __init__(self):
-        self.data_ingestion_config = DataIngestionConfig()
+    stage_names = ["data_ingestion",
+                   "data_validation",
+                   "data_transformation",
+                   "model_trainer",
+                   "model_evaluation",
+                   "model_pusher"]
+
+    def __init__(self,stage_callback=None,data_ingestion_config:DataIngestionConfig=None):
+        """
+        :param stage_callback: optional callable(stage_name, state, artifact) notified when a stage starts and ends
+        :param data_ingestion_config: optional data ingestion configuration, e.g. a sampled one for smoke retrains
+        """
+        self.stage_callback = stage_callback
+        self.data_ingestion_config = data_ingestion_config if data_ingestion_config is not None else DataIngestionConfig()
         self.data_validation_config = DataValidationConfig()
         self.data_transformation_config = DataTransformationConfig()
         self.model_trainer_config = ModelTrainerConfig()
@@ -77,14 +90,16 @@ class TrainingPipeline:
         except Exception as e:
             raise VisaException(e,sys)
         
-    def start_model_trainer(self,data_transformation_artifact:DataTransformationArtifact)->ModelTrainerArtifact:
+    def start_model_trainer(self,data_transformation_artifact:DataTransformationArtifact,
+                            data_validation_artifact:DataValidationArtifact=None)->ModelTrainerArtifact:
         """
         This method is initiating model trainer component of pipeline
         """
         try:
             logging.info("starting model training")
             model_trainer = ModelTrainer(data_transformation_artifact=data_transformation_artifact,
-                                         model_trainer_config=self.model_trainer_config)
+                                         model_trainer_config=self.model_trainer_config,
+                                         data_validation_artifact=data_validation_artifact)
             model_trainer_artifact = model_trainer.initiate_model_trainer()
 
             logging.info("performed model training")
@@ -123,25 +138,49 @@ class TrainingPipeline:
         except Exception as e:
             raise VisaException(e,sys)
         
+    def run_stage(self,stage_name,stage_method,*args):
+        """
+        runs stage_method and notifies stage_callback before and after it
+        """
+        if self.stage_callback is not None:
+            self.stage_callback(stage_name,"running",None)
+        artifact = stage_method(*args)
+        if self.stage_callback is not None:
+            self.stage_callback(stage_name,"succeeded",artifact)
+        return artifact
+
     def run_pipeline(self):
         """
         this method of TrainingPipeline class is responsible for running complete pipeline
         """
         try:
-            data_ingestion_artifact = self.start_data_ingestion()
-            data_validation_artifact = self.start_data_validation(data_ingestion_artifact)
-            data_transformation_artifact = self.start_data_transformation(data_ingestion_artifact,data_validation_artifact)
-            model_trainer_artifact = self.start_model_trainer(data_transformation_artifact)
-            model_evaluation_artifact = self.start_model_evaluation(model_trainer_artifact,data_ingestion_artifact)
+            data_ingestion_artifact = self.run_stage("data_ingestion",self.start_data_ingestion)
+            data_validation_artifact = self.run_stage("data_validation",self.start_data_validation,data_ingestion_artifact)
+            data_transformation_artifact = self.run_stage("data_transformation",self.start_data_transformation,data_ingestion_artifact,data_validation_artifact)
+            model_trainer_artifact = self.run_stage("model_trainer",self.start_model_trainer,data_transformation_artifact,data_validation_artifact)
+            model_evaluation_artifact = self.run_stage("model_evaluation",self.start_model_evaluation,model_trainer_artifact,data_ingestion_artifact)
 
             if not model_evaluation_artifact.is_model_excepted:
                 logging.info("model not accepted")
                 return None
-            model_pusher_artifact = self.start_model_pusher(model_evaluation_artifact)
+            if self.data_ingestion_config.is_sampled:
+                # model trained on a sample is never pushed to production
+                logging.info("sampled training run, model not pushed")
+                return None
+            model_pusher_artifact = self.run_stage("model_pusher",self.start_model_pusher,model_evaluation_artifact)
+            return model_pusher_artifact
 
         except Exception as e:
             raise VisaException(e,sys)
                 
 if __name__=='__main__':
-    obj = TrainingPipeline()
+    parser = argparse.ArgumentParser(description="run usvisa training pipeline")
+    parser.add_argument("--sample-size",type=int,default=None,help="train on stratified sample of this many documents")
+    parser.add_argument("--sample-fraction",type=float,default=None,help="train on stratified sample of this fraction of documents")
+    parser.add_argument("--sample-method",choices=["sample","reservoir"],default=DataIngestionConfig.sample_method)
+    args = parser.parse_args()
+
+    obj = TrainingPipeline(data_ingestion_config=DataIngestionConfig(sample_size=args.sample_size,
+                                                                     sample_fraction=args.sample_fraction,
+                                                                     sample_method=args.sample_method))
     obj.run_pipeline()
\ No newline at end of file
@@ -1,9 +1,14 @@
 from us_visa.exception import VisaException
+from us_visa.logger import logging
+from us_visa.constant import CURRENT_YEAR
 import yaml
 import sys
 import os
 import pickle
 import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from pandas import DataFrame
 
 def write_yaml_file(filepath:str,obj:object,replace=False):
@@ -62,4 +67,200 @@ def drop_columns(df:DataFrame,cols:list)->DataFrame:
     except Exception as e:
         raise VisaException(e,sys)
 
+def add_company_age(df:DataFrame)->DataFrame:
+    """
+    returns dataframe with company_age derived from yr_of_estab, dataframe is returned unchanged
+    when company_age is already present (derived by mongodb export) or yr_of_estab is missing
+    """
+    if 'company_age' in df.columns or 'yr_of_estab' not in df.columns:
+        return df
+    return df.assign(company_age=CURRENT_YEAR - df['yr_of_estab'])
+
+
+
+def write_dataframe(dataframe:DataFrame,filepath:str,categorical_columns:list=None):
+    """
+    writes dataframe in the format given by file extension (.parquet or .csv)
+    categorical_columns are stored dictionary encoded in parquet files
+    """
+    try:
+        dir_path = os.path.dirname(filepath)
+        if dir_path != "":
+            os.makedirs(dir_path,exist_ok=True)
+        if filepath.endswith('.parquet'):
+            if categorical_columns is not None:
+                columns = [column for column in categorical_columns if column in dataframe.columns]
+                dataframe = dataframe.astype({column:'category' for column in columns})
+            dataframe.to_parquet(filepath,index=False)
+        else:
+            dataframe.to_csv(filepath,index=False,header=True)
+    except Exception as e:
+        raise VisaException(e,sys)
+
+class DataFrameChunkWriter:
+    """
+    This class appends dataframe chunks to one parquet or csv file. Columns are taken from the first chunk,
+    every chunk gets the dtypes compact_dataframe gives the whole dataset, with widths and categories fixed
+    up front so later chunks fit the parquet schema: int columns are int32, float64 when the first chunk holds
+    fractions, category columns with schema domains are dictionary encoded over domain values and other
+    category columns are strings. Columns missing from a later chunk are written as nulls. Chunks go to
+    a temporary file which replaces filepath only when the writer exits without exception, a failed export
+    keeps the previous file
+    """
+    def __init__(self,filepath:str,schema_config:dict=None):
+        """
+        :param filepath : parquet or csv file to write
+        :param schema_config : schema.yaml content, its columns and domains give parquet types
+        """
+        self.filepath = filepath
+        self.n_rows = 0
+        filepath_root,file_extension = os.path.splitext(filepath)
+        self.tmp_filepath = f"{filepath_root}.tmp{file_extension}"
+        schema_config = schema_config or {'columns':[]}
+        self._column_dtypes = {column:dtype for column_dtype in schema_config['columns'] for column,dtype in column_dtype.items()}
+        self._domains = {column:[str(value) for value in values] for column,values in schema_config.get('domains',{}).items()
+                         if self._column_dtypes.get(column) == 'category'}
+        self._parquet_writer = None
+        self._schema = None
+        self._columns = None
+        dir_path = os.path.dirname(filepath)
+        if dir_path != "":
+            os.makedirs(dir_path,exist_ok=True)
+        if os.path.exists(self.tmp_filepath):
+            os.remove(self.tmp_filepath)
+
+    def get_field(self,column:str,field:pa.Field)->pa.Field:
+        dtype = self._column_dtypes.get(column)
+        if dtype == 'int':
+            is_integer = pa.types.is_integer(field.type) or pa.types.is_null(field.type)
+            return pa.field(column,pa.int32() if is_integer else pa.float64())
+        if column in self._domains:
+            return pa.field(column,pa.dictionary(pa.int32(),pa.string()))
+        if dtype == 'category' or pa.types.is_dictionary(field.type):
+            return pa.field(column,pa.string())
+        if pa.types.is_integer(field.type) or pa.types.is_floating(field.type) or pa.types.is_null(field.type):
+            return pa.field(column,pa.float64())
+        return field
+
+    def compact_chunk(self,dataframe:DataFrame)->DataFrame:
+        """
+        makes category columns with domains categorical over domain values, values outside domain are kept
+        as extra categories so validation still counts them
+        """
+        columns = {}
+        for column in self._domains:
+            if column in dataframe.columns:
+                series = dataframe[column]
+                values = series.astype(object).where(series.isna(),series.astype(str))
+                extra_values = sorted(set(values.dropna()) - set(self._domains[column]))
+                columns[column] = pd.Categorical(values,categories=self._domains[column] + extra_values)
+        return dataframe.assign(**columns) if len(columns) > 0 else dataframe
+
+    def write(self,dataframe:DataFrame):
+        try:
+            if self._columns is None:
+                self._columns = list(dataframe.columns)
+            extra_columns = [column for column in dataframe.columns if column not in self._columns]
+            if len(extra_columns) > 0:
+                raise ValueError(f"columns {extra_columns} are not in columns {self._columns} of first chunk")
+            dataframe = dataframe.reindex(columns=self._columns)
+
+            if self.filepath.endswith('.parquet'):
+                dataframe = self.compact_chunk(dataframe)
+                if self._schema is None:
+                    schema = pa.Schema.from_pandas(dataframe,preserve_index=False).remove_metadata()
+                    self._schema = pa.schema([self.get_field(field.name,field) for field in schema])
+                    self._parquet_writer = pq.ParquetWriter(self.tmp_filepath,self._schema)
+                self._parquet_writer.write_table(pa.Table.from_pandas(dataframe,schema=self._schema,preserve_index=False))
+            else:
+                dataframe.to_csv(self.tmp_filepath,mode='a',index=False,header=self.n_rows == 0)
+            self.n_rows += len(dataframe)
+        except Exception as e:
+            raise VisaException(e,sys)
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
+
+    def commit(self):
+        """
+        replaces filepath by written chunks, filepath is removed when no chunk was written
+        """
+        self.close()
+        if os.path.exists(self.tmp_filepath):
+            os.replace(self.tmp_filepath,self.filepath)
+        elif os.path.exists(self.filepath):
+            os.remove(self.filepath)
+
+    def discard(self):
+        self.close()
+        if os.path.exists(self.tmp_filepath):
+            os.remove(self.tmp_filepath)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,exc_type,exc_value,traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
+
+def get_memory_usage(dataframe:DataFrame)->int:
+    """
+    returns bytes used by dataframe including python objects held in object columns
+    """
+    return int(dataframe.memory_usage(index=True,deep=True).sum())
+
+def compact_dataframe(dataframe:DataFrame,schema_config:dict)->DataFrame:
+    """
+    applies dtypes declared in schema: int columns get the smallest integer width holding their values
+    and category columns become categorical when that is smaller, so unique per row keys stay strings
+    """
+    try:
+        column_dtypes = {column:dtype for column_dtype in schema_config['columns'] for column,dtype in column_dtype.items()}
+        dtypes = {}
+        for column in dataframe.columns:
+            dtype = column_dtypes.get(column)
+            series = dataframe[column]
+            if dtype == 'int' and pd.api.types.is_integer_dtype(series.dtype):
+                dtypes[column] = pd.to_numeric(series,downcast='integer').dtype
+            elif dtype == 'category' and series.dtype == object and series.nunique() < len(series)//2:
+                dtypes[column] = 'category'
+        return dataframe.astype(dtypes) if len(dtypes) > 0 else dataframe
+    except Exception as e:
+        raise VisaException(e,sys)
+
+def get_dataframe_columns(filepath:str)->list:
+    """
+    returns column names of parquet or csv file without reading its data
+    """
+    try:
+        if filepath.endswith('.parquet'):
+            return pq.read_schema(filepath).names
+        return list(pd.read_csv(filepath,nrows=0).columns)
+    except Exception as e:
+        raise VisaException(e,sys)
+
+def read_dataframe(filepath:str,columns:list=None,schema_config:dict=None,stage:str=None)->DataFrame:
+    """
+    reads parquet or csv file into dataframe, only columns are read when given
+    with schema_config dtypes are compacted and memory before and after is logged for stage
+    """
+    try:
+        if filepath.endswith('.parquet'):
+            dataframe = pd.read_parquet(filepath,columns=columns)
+        else:
+            dataframe = pd.read_csv(filepath,usecols=columns)
+        if schema_config is not None:
+            memory_before = get_memory_usage(dataframe)
+            dataframe = compact_dataframe(dataframe,schema_config)
+            log_memory_report(stage or filepath,memory_before,get_memory_usage(dataframe),filepath)
+        return dataframe
+    except Exception as e:
+        raise VisaException(e,sys)
 
+def log_memory_report(stage:str,memory_before:int,memory_after:int,name:str=""):
+    logging.info(f"memory report [{stage}] {name}: {memory_before/1024/1024:.2f} MB -> {memory_after/1024/1024:.2f} MB "
+                 f"({(1 - memory_after/memory_before) if memory_before > 0 else 0:.0%} saved)")
@@ -0,0 +1,71 @@
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import GaugeMetricFamily
+
+PREDICTION_STAGE_SECONDS = Histogram("usvisa_prediction_stage_seconds",
+                                     "Time spent in each stage of the prediction request path",
+                                     ["stage"],
+                                     buckets=(0.0001,0.00025,0.0005,0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10))
+
+PREDICTION_BATCH_REQUESTS = Histogram("usvisa_prediction_batch_requests",
+                                      "Requests coalesced into one model call by the prediction batcher",
+                                      buckets=(1,2,4,8,16,32,64,128,256,512,1024))
+
+PREDICTION_BATCH_RECORDS = Histogram("usvisa_prediction_batch_records",
+                                     "Records per model call of the prediction batcher",
+                                     buckets=(1,2,4,8,16,32,64,128,256,512,1024))
+
+PREDICTION_REQUESTS = Counter("usvisa_prediction_requests_total",
+                              "Predictions served per endpoint and outcome",
+                              ["endpoint","outcome"])
+
+MODEL_VERSION_INFO = Gauge("usvisa_model_version_info",
+                           "Version of the loaded production model, value is 1 for the current version",
+                           ["version"])
+
+MODEL_LOADED_TIMESTAMP = Gauge("usvisa_model_loaded_timestamp_seconds",
+                               "Unix time when the current production model was loaded")
+
+
+def time_stage(stage:str):
+    """
+    returns context manager which observes duration of stage in PREDICTION_STAGE_SECONDS
+    """
+    return PREDICTION_STAGE_SECONDS.labels(stage=stage).time()
+
+
+def set_model_version(version):
+    MODEL_VERSION_INFO.clear()
+    MODEL_VERSION_INFO.labels(version=str(version)).set(1)
+    MODEL_LOADED_TIMESTAMP.set_to_current_time()
+
+
+class MetricsSourceCollector:
+    """
+    This class exposes numeric values of a get_metrics() dict as gauges named usvisa_<name>_<key>
+    """
+    def __init__(self,name:str,get_metrics):
+        self.name = name
+        self.get_metrics = get_metrics
+
+    def collect(self):
+        metrics = self.get_metrics()
+        if metrics is None:
+            return
+        for key,value in metrics.items():
+            if isinstance(value,bool) or not isinstance(value,(int,float)):
+                continue
+            yield GaugeMetricFamily(f"usvisa_{self.name}_{key}",f"{key} of {self.name}",value=value)
+
+
+def register_metrics_source(name:str,get_metrics):
+    """
+    registers callable returning a dict of numbers, values are read on every scrape
+    """
+    REGISTRY.register(MetricsSourceCollector(name,get_metrics))
+
+
+def get_metrics_exposition():
+    """
+    returns (body, content type) of all metrics in prometheus text format
+    """
+    return generate_latest(REGISTRY),CONTENT_TYPE_LATEST